@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from cv_app.tasks import PROCESSING_BATCH_SIZE, requeue_stale_tasks, run_once
+
+
+class Command(BaseCommand):
+    help = "Pre-process queued application CVs (extract, parse, embed) through the matcher service"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PROCESSING_BATCH_SIZE,
+                            help='Applications sent to the matcher per call')
+        parser.add_argument('--poll-seconds', type=float, default=5.0,
+                            help='Wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_tasks()
+        if requeued:
+            self.stdout.write(f"Re-queued {requeued} stale processing tasks")
+
+        while True:
+            claimed = run_once(options['batch_size'])
+            if claimed:
+                self.stdout.write(f"Processed {claimed} applications")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_seconds'])
+            requeue_stale_tasks()
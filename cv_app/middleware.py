@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+from collections import Counter, deque
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+# ------ Configuration ------
+QUERY_STATS_SAMPLES = 1000  # Latencies kept per URL name for the percentiles
+QUERY_STATS_DUPLICATE_THRESHOLD = 3  # Runs of the same SQL in one request that flag a likely N+1
+QUERY_STATS_MAX_FLAGGED = 10  # Duplicated statements reported per URL name
+UNRESOLVED_URL_NAME = '<unresolved>'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook collecting (sql, seconds) for every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def duplicates(self, threshold=QUERY_STATS_DUPLICATE_THRESHOLD):
+        """SQL run at least `threshold` times, with its count; placeholders keep parameters out of the SQL"""
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count >= threshold}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class QueryStats:
+    """Per URL name request, latency and SQL counters, shared by every request in the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, url_name, seconds, recorder):
+        duplicates = recorder.duplicates()
+        with self._lock:
+            view = self._views.setdefault(url_name, {
+                'requests': 0,
+                'latencies': deque(maxlen=QUERY_STATS_SAMPLES),
+                'queries': 0,
+                'max_queries': 0,
+                'sql_seconds': 0.0,
+                'flagged_requests': 0,
+                'duplicates': {},
+            })
+            view['requests'] += 1
+            view['latencies'].append(seconds)
+            view['queries'] += len(recorder)
+            view['max_queries'] = max(view['max_queries'], len(recorder))
+            view['sql_seconds'] += recorder.seconds
+            if duplicates:
+                view['flagged_requests'] += 1
+            for sql, count in duplicates.items():
+                flagged = view['duplicates'].get(sql)
+                if flagged is None:
+                    if len(view['duplicates']) >= QUERY_STATS_MAX_FLAGGED:
+                        continue
+                    print(f"⚠️  Possible N+1 in {url_name}: {count}x {sql[:120]}")
+                    flagged = view['duplicates'][sql] = {'requests': 0, 'max_repeats': 0}
+                flagged['requests'] += 1
+                flagged['max_repeats'] = max(flagged['max_repeats'], count)
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: dict(view, latencies=sorted(view['latencies'])) for name, view in self._views.items()}
+        report = {}
+        for name, view in sorted(views.items()):
+            latencies, requests = view['latencies'], view['requests']
+            report[name] = {
+                'requests': requests,
+                'latency_ms': {
+                    label: round(percentile(latencies, fraction) * 1000, 2)
+                    for label, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))
+                },
+                'queries': {
+                    'total': view['queries'],
+                    'per_request': round(view['queries'] / requests, 2),
+                    'max': view['max_queries'],
+                },
+                'sql_ms': {
+                    'total': round(view['sql_seconds'] * 1000, 2),
+                    'per_request': round(view['sql_seconds'] * 1000 / requests, 2),
+                },
+                'likely_n_plus_one': {
+                    'requests': view['flagged_requests'],
+                    'queries': [
+                        {'sql': sql, **flagged}
+                        for sql, flagged in sorted(view['duplicates'].items(),
+                                                   key=lambda item: item[1]['max_repeats'], reverse=True)
+                    ],
+                },
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+query_stats = QueryStats()
+
+
+class QueryStatsMiddleware:
+    """
+    Record request count, latency and SQL queries per URL name into
+    query_stats. Opt-in: only installed when settings.QUERY_STATS_ENABLED
+    is true; read the numbers from the admin-only /api/query-stats/.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_STATS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        url_name = (match.url_name or match.route) if match else UNRESOLVED_URL_NAME
+        query_stats.record(url_name, elapsed, recorder)
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_app', '0003_application_cv_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relevance_score', models.IntegerField()),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('combined_score', models.FloatField(blank=True, null=True)),
+                ('justification', models.TextField(blank=True)),
+                ('key_matches', models.JSONField(blank=True, default=list)),
+                ('missing_requirements', models.JSONField(blank=True, default=list)),
+                ('soft_skills', models.JSONField(blank=True, default=list)),
+                ('domain_fit', models.CharField(blank=True, max_length=255)),
+                ('scored_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='score', to='cv_app.application')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='application_scores', to='cv_app.job')),
+            ],
+        ),
+    ]
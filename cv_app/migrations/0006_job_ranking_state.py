@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_app', '0005_processing_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='cv_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='JobRankingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description_hash', models.CharField(max_length=64)),
+                ('ranked_hashes', models.JSONField(blank=True, default=dict)),
+                ('ranked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ranking_state', to='cv_app.job')),
+            ],
+        ),
+    ]
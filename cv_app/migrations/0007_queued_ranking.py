@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv_app', '0006_job_ranking_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ranking_id', models.CharField(max_length=64, unique=True)),
+                ('description_hash', models.CharField(max_length=64)),
+                ('cv_hashes', models.JSONField(blank=True, default=dict)),
+                ('full', models.BooleanField(default=False)),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('saved_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_rankings', to='cv_app.job')),
+            ],
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
@@ -39,6 +40,109 @@ class Application(models.Model):
         ('accepted', 'Accepted'),
         ('rejected', 'Rejected'),
     ], default='pending')
+    # CV extraction, parsing and embedding, done in the background by run_worker
+    processing_status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ], default='pending')
+    processing_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    cv_sha256 = models.CharField(max_length=64, blank=True)  # Content hash of cv_file, to spot changed CVs
+
+    def compute_cv_sha256(self):
+        digest = hashlib.sha256()
+        if self.cv_file._committed:
+            with self.cv_file.open('rb') as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+        else:  # A new upload, still in memory or a temporary file
+            for chunk in self.cv_file.file.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    _saved_cv_name = None  # cv_file name as last loaded or saved; None for new instances
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The raw column value, so a deferred cv_file is not loaded
+        instance._saved_cv_name = instance.__dict__.get('cv_file')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Hash only when the file itself changed; rows saved before cv_sha256
+        # existed are backfilled where rankings need it, not on every save
+        if 'cv_file' in self.__dict__:
+            if not self.cv_file:
+                self.cv_sha256 = ''
+            elif not self.cv_file._committed or self.cv_file.name != self._saved_cv_name:
+                self.cv_sha256 = self.compute_cv_sha256()
+        super().save(*args, **kwargs)
+        if 'cv_file' in self.__dict__:
+            self._saved_cv_name = self.cv_file.name
 
     def __str__(self):
         return f"{self.applicant.username} applied for {self.job.title}"
+
+class ProcessingTask(models.Model):
+    """Queued CV pre-processing for one application, claimed by the run_worker command"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='processing_tasks')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Processing {self.application} ({self.status})"
+
+class ApplicationScore(models.Model):
+    """Latest matcher result for one application, so rankings are served from the database"""
+    application = models.OneToOneField(Application, on_delete=models.CASCADE, related_name='score')
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='application_scores')
+    relevance_score = models.IntegerField()
+    similarity = models.FloatField(blank=True, null=True)
+    combined_score = models.FloatField(blank=True, null=True)
+    justification = models.TextField(blank=True)
+    key_matches = models.JSONField(default=list, blank=True)
+    missing_requirements = models.JSONField(default=list, blank=True)
+    soft_skills = models.JSONField(default=list, blank=True)
+    domain_fit = models.CharField(max_length=255, blank=True)
+    scored_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.application} scored {self.relevance_score}"
+
+class JobRankingState(models.Model):
+    """What the stored ApplicationScores of a job were computed from, for incremental re-ranking"""
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name='ranking_state')
+    description_hash = models.CharField(max_length=64)
+    ranked_hashes = models.JSONField(default=dict, blank=True)  # Application id -> cv_sha256 sent to the matcher
+    ranked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Ranking state for {self.job}"
+
+class QueuedRanking(models.Model):
+    """An async ranking submitted to the matcher: what was sent, so the result is stored as of submission"""
+    ranking_id = models.CharField(max_length=64, unique=True)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='queued_rankings')
+    description_hash = models.CharField(max_length=64)
+    cv_hashes = models.JSONField(default=dict, blank=True)  # Application id -> cv_sha256 sent
+    full = models.BooleanField(default=False)
+    submitted_at = models.DateTimeField(default=timezone.now)
+    saved_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Ranking {self.ranking_id} for {self.job}"
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class JobCursorPagination(CursorPagination):
+    """Newest jobs first; a cursor keeps each page a single indexed query however deep it is"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
@@ -1,15 +1,42 @@
 from rest_framework import serializers
-from .models import Job, Application, CustomUser
+from .models import Job, Application, ApplicationScore, CustomUser
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
 
+class FieldsProjectionMixin:
+    """
+    Serialize only the fields named in `fields`; nested serializers are
+    projected with dotted names, e.g. ["id", "applications.cv_url"].
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            self.project(fields)
+
+    def project(self, fields):
+        requested = {}
+        for name in fields:
+            top, _, nested = name.partition('.')
+            requested.setdefault(top, [])
+            if nested:
+                requested[top].append(nested)
+        for name in list(self.fields):
+            if name not in requested:
+                self.fields.pop(name)
+            elif requested[name]:
+                child = getattr(self.fields[name], 'child', self.fields[name])
+                if isinstance(child, FieldsProjectionMixin):
+                    child.project(requested[name])
+
+
 class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
         fields = ['id', 'title', 'description', 'location', 'created_at']
 
-class ApplicationSerializer(serializers.ModelSerializer):
+class ApplicationSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     applicant_email = serializers.SerializerMethodField()
     applicant_username = serializers.SerializerMethodField()
     cv_url = serializers.FileField(source='cv_file', read_only=True)
@@ -29,6 +56,18 @@ class ApplicationSerializer(serializers.ModelSerializer):
         return None
 
 
+class ApplicationScoreSerializer(serializers.ModelSerializer):
+    application_id = serializers.IntegerField(source='application.id', read_only=True)
+    applicant = serializers.CharField(source='application.applicant.username', read_only=True)
+    cv_path = serializers.CharField(source='application.cv_file.name', read_only=True)
+
+    class Meta:
+        model = ApplicationScore
+        fields = ['application_id', 'applicant', 'cv_path', 'relevance_score', 'similarity',
+                  'combined_score', 'justification', 'key_matches', 'missing_requirements',
+                  'soft_skills', 'domain_fit', 'scored_at']
+
+
 User = get_user_model()
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -51,7 +90,8 @@ from rest_framework import serializers
 from .models import Job, Application
 from .serializers import ApplicationSerializer   # already defined above
 
-class JobWithApplicationsSerializer(serializers.ModelSerializer):
+class JobWithApplicationsSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
+    # Expects applications prefetched with their applicant (see view_company_applications)
     applications = ApplicationSerializer(many=True, read_only=True)
 
     class Meta:
@@ -59,8 +59,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cv_app.middleware.QueryStatsMiddleware',  # Inactive unless QUERY_STATS_ENABLED
 ]
 
+# Per-URL request, latency and SQL query stats, served at /api/query-stats/ to admins
+QUERY_STATS_ENABLED = config('QUERY_STATS_ENABLED', default=False, cast=bool)
+
 ROOT_URLCONF = 'cv_app.urls'
 
 TEMPLATES = [
@@ -151,6 +155,8 @@ REST_FRAMEWORK = {
     )
 }
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+# CV matcher service (scripts/process_cvs.py); it reads CVs straight from MEDIA_ROOT
+MATCHER_URL = config('MATCHER_URL', default='http://127.0.0.1:8001')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
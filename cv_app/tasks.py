@@ -0,0 +1,98 @@
+import requests
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import Application, ProcessingTask
+
+# ------ Configuration ------
+PROCESSING_BATCH_SIZE = 8  # Applications sent to the matcher per call, so embeddings are batched
+PROCESSING_MAX_ATTEMPTS = 3
+PROCESSING_STALE_SECONDS = 30 * 60  # A running task untouched this long is assumed orphaned by a dead worker
+PROCESSING_TIMEOUT_SECONDS = 600
+
+
+def enqueue_processing(application):
+    """
+    Queue extraction, parsing and embedding of an application's CV, so a
+    later ranking only pays for scoring. Applications without a CV are skipped.
+    """
+    if not application.cv_file:
+        return None
+    return ProcessingTask.objects.create(application=application)
+
+
+def requeue_stale_tasks():
+    """Put tasks left running by a worker that died back in the queue"""
+    cutoff = timezone.now() - timedelta(seconds=PROCESSING_STALE_SECONDS)
+    return ProcessingTask.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='queued', updated_at=timezone.now()
+    )
+
+
+def claim_tasks(limit=PROCESSING_BATCH_SIZE):
+    """
+    Claim up to `limit` queued tasks, oldest first. Each claim is a
+    conditional update, so concurrent workers never run the same task.
+    """
+    candidate_ids = list(
+        ProcessingTask.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)[:limit]
+    )
+    claimed = [
+        task_id for task_id in candidate_ids
+        if ProcessingTask.objects.filter(id=task_id, status='queued').update(
+            status='running', attempts=F('attempts') + 1, updated_at=timezone.now()
+        )
+    ]
+    return list(ProcessingTask.objects.filter(id__in=claimed).select_related('application'))
+
+
+def finish_task(task):
+    now = timezone.now()
+    ProcessingTask.objects.filter(id=task.id).update(status='done', error='', updated_at=now)
+    Application.objects.filter(id=task.application_id).update(
+        processing_status='ready', processing_error='', processed_at=now
+    )
+
+
+def fail_task(task, message):
+    """Re-queue the task until it runs out of attempts, then mark it and its application failed"""
+    final = task.attempts >= PROCESSING_MAX_ATTEMPTS
+    ProcessingTask.objects.filter(id=task.id).update(
+        status='failed' if final else 'queued', error=message, updated_at=timezone.now()
+    )
+    Application.objects.filter(id=task.application_id).update(
+        processing_status='failed' if final else 'pending', processing_error=message
+    )
+
+
+def process_tasks(tasks):
+    """Pre-process the claimed tasks' CVs in one matcher call and record each outcome"""
+    by_path = {task.application.cv_file.path: task for task in tasks}
+    Application.objects.filter(id__in=[task.application_id for task in tasks]).update(processing_status='processing')
+
+    try:
+        response = requests.post(f"{settings.MATCHER_URL}/preprocess-cvs", json={'cv_paths': list(by_path)},
+                                 timeout=PROCESSING_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        outcomes = {outcome['cv_path']: outcome for outcome in response.json()['results']}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        outcomes = {path: {'status': 'failed', 'message': f"Matcher request failed: {e}"} for path in by_path}
+
+    processed = 0
+    for path, task in by_path.items():
+        outcome = outcomes.get(path, {'status': 'failed', 'message': 'No result from the matcher'})
+        if outcome['status'] == 'ready':
+            finish_task(task)
+            processed += 1
+        else:
+            fail_task(task, outcome.get('message', 'Processing failed'))
+    return processed
+
+
+def run_once(batch_size=PROCESSING_BATCH_SIZE):
+    """Claim and process one batch; returns the number of tasks claimed"""
+    tasks = claim_tasks(batch_size)
+    if tasks:
+        process_tasks(tasks)
+    return len(tasks)
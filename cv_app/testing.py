@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+from django.db import DEFAULT_DB_ALIAS, connections
+from .middleware import QUERY_STATS_DUPLICATE_THRESHOLD, QueryRecorder
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None, using=DEFAULT_DB_ALIAS):
+    """
+    Fail if the block runs more than `max_queries` SQL queries, or, with
+    `max_repeats`, any single statement more than that many times (an N+1).
+    Unlike assertNumQueries it passes under budget, so small improvements
+    do not break tests, and a failure lists the queries and duplicates.
+
+        with query_budget(2):
+            client.get('/api/company/applications/')
+    """
+    recorder = QueryRecorder()
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+
+    problems = []
+    if len(recorder) > max_queries:
+        problems.append(f"{len(recorder)} queries, budget {max_queries}")
+    if max_repeats is not None:
+        repeated = recorder.duplicates(threshold=max_repeats + 1)
+        if repeated:
+            problems.append(f"statements repeated more than {max_repeats} times")
+    if problems:
+        lines = [f"  {i}. {sql}" for i, (sql, _) in enumerate(recorder.queries, 1)]
+        duplicates = recorder.duplicates(threshold=max_repeats + 1 if max_repeats is not None
+                                         else QUERY_STATS_DUPLICATE_THRESHOLD)
+        lines += [f"  repeated {count}x: {sql}" for sql, count in duplicates.items()]
+        raise AssertionError("Query budget exceeded: " + "; ".join(problems) + "\n" + "\n".join(lines))
@@ -0,0 +1,364 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+import requests
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from .middleware import query_stats
+from django.utils import timezone
+from .models import CustomUser, Job, Application, ApplicationScore, ProcessingTask
+from .tasks import (PROCESSING_MAX_ATTEMPTS, PROCESSING_STALE_SECONDS, claim_tasks, enqueue_processing,
+                    requeue_stale_tasks, run_once)
+from .testing import query_budget
+
+
+class CompanyApplicationsQueryTests(TestCase):
+    """The company dashboard must cost the same number of queries however many applications there are"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = CustomUser.objects.create_user('acme', password='x', user_type='company')
+        cls.seekers = [
+            CustomUser.objects.create_user(f'seeker{i}', email=f'seeker{i}@example.com', password='x')
+            for i in range(5)
+        ]
+        for i in range(3):
+            cls.add_job(f'Job {i}', applicants=2)
+
+    @classmethod
+    def add_job(cls, title, applicants):
+        job = Job.objects.create(title=title, description='Python developer', location='Remote',
+                                 posted_by=cls.company)
+        for seeker in cls.seekers[:applicants]:
+            Application.objects.create(job=job, applicant=seeker)
+        return job
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.company)
+
+    def test_query_count_is_constant(self):
+        # One query for the page of jobs, one for their applications with applicants
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/company/applications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+
+        for i in range(5):
+            self.add_job(f'Busy job {i}', applicants=5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/company/applications/')
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(response.data['results'][0]['applications'][0]['applicant_email'], 'seeker0@example.com')
+
+    def test_cursor_pagination(self):
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/company/applications/', {'page_size': 2})
+        self.assertEqual([job['title'] for job in first.data['results']], ['Job 2', 'Job 1'])
+        self.assertIsNotNone(first.data['next'])
+
+        with self.assertNumQueries(2):
+            second = self.client.get(first.data['next'])
+        self.assertEqual([job['title'] for job in second.data['results']], ['Job 0'])
+        self.assertIsNone(second.data['next'])
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/company/applications/',
+                                   {'fields': 'id,title,applications.applicant_username'})
+        job = response.data['results'][0]
+        self.assertEqual(set(job), {'id', 'title', 'applications'})
+        self.assertEqual(set(job['applications'][0]), {'applicant_username'})
+
+    def test_job_seekers_are_refused(self):
+        self.client.force_authenticate(self.seekers[0])
+        response = self.client.get('/api/company/applications/')
+        self.assertEqual(response.status_code, 403)
+
+
+class IncrementalRankingTests(TestCase):
+    """rank_applicants sends the matcher only what changed since the last ranking"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.company = CustomUser.objects.create_user('acme', password='x', user_type='company')
+        self.seeker = CustomUser.objects.create_user('seeker', password='x')
+        self.job = Job.objects.create(title='Developer', description='Python developer', location='Remote',
+                                      posted_by=self.company)
+        self.applications = [self.apply(f'cv{i}.pdf', b'CV %d' % i) for i in range(3)]
+        self.sent = []  # cv_paths of each matcher call
+        self.client = APIClient()
+        self.client.force_authenticate(self.company)
+
+    def apply(self, name, content):
+        application = Application(job=self.job, applicant=self.seeker)
+        application.cv_file.save(name, ContentFile(content))
+        return application
+
+    def fake_match(self, url, json=None, params=None):
+        self.sent.append(json['cv_paths'])
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'results': [
+            {'status': 'scored', 'cv_path': path, 'relevance_score': 70, 'similarity': 0.5,
+             'combined_score': 0.6, 'justification': 'Good match', 'key_matches': ['python'],
+             'missing_requirements': [], 'soft_skills': [], 'domain_fit': 'Software'}
+            for path in json['cv_paths']
+        ]}
+        return response
+
+    def rank(self):
+        with mock.patch('cv_app.views.requests.post', side_effect=self.fake_match):
+            response = self.client.get(f'/api/rank-applicants/{self.job.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['ranked']
+
+    def test_repeat_get_is_served_from_the_database(self):
+        self.assertEqual(len(self.rank()), 3)
+        self.assertEqual(len(self.rank()), 3)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_only_new_application_is_sent(self):
+        self.rank()
+        new = self.apply('cv_new.pdf', b'A new CV')
+        ranked = self.rank()
+        self.assertEqual(self.sent[-1], [new.cv_file.path])
+        self.assertEqual(len(ranked), 4)
+
+    def test_changed_cv_is_resent(self):
+        self.rank()
+        changed = Application.objects.get(id=self.applications[0].id)
+        changed.cv_file.save('cv0_v2.pdf', ContentFile(b'An updated CV'))
+        self.rank()
+        self.assertEqual(self.sent[-1], [changed.cv_file.path])
+
+    def test_description_change_reranks_everyone(self):
+        self.rank()
+        self.job.description = 'Django developer'
+        self.job.save()
+        self.rank()
+        self.assertEqual(len(self.sent[-1]), 3)
+        self.rank()
+        self.assertEqual(len(self.sent), 2)
+
+    def rank_with(self, change):
+        """Rank once with `change(summary, path)` applied to the result for the second CV"""
+        path = self.applications[1].cv_file.path
+
+        def match(url, json=None, params=None):
+            response = self.fake_match(url, json=json, params=params)
+            change(response.json.return_value, path)
+            return response
+
+        with mock.patch('cv_app.views.requests.post', side_effect=match):
+            return self.client.get(f'/api/rank-applicants/{self.job.id}/').data['ranked'], path
+
+    def test_missing_cv_is_resent(self):
+        def drop(summary, path):
+            summary['results'] = [r for r in summary['results'] if r['cv_path'] != path]
+
+        ranked, path = self.rank_with(drop)
+        self.assertEqual(len(ranked), 2)
+        self.rank()
+        self.assertEqual(self.sent[-1], [path])
+
+    def test_failed_analysis_is_not_stored_and_is_resent(self):
+        def fail(summary, path):
+            for result in summary['results']:
+                if result['cv_path'] == path:
+                    result.update(relevance_score=0, justification='Analysis failed', analysis_failed=True)
+
+        ranked, path = self.rank_with(fail)
+        self.assertEqual(len(ranked), 2)
+        self.assertFalse(ApplicationScore.objects.filter(application=self.applications[1]).exists())
+        self.rank()
+        self.assertEqual(self.sent[-1], [path])
+
+    def test_prefilter_skipped_cv_is_not_resent(self):
+        def skip(summary, path):
+            summary['results'] = [r for r in summary['results'] if r['cv_path'] != path]
+            summary['skipped'] = [{'status': 'skipped', 'cv_path': path, 'similarity': 0.1}]
+
+        ranked, _ = self.rank_with(skip)
+        self.assertEqual(len(ranked), 2)
+        self.rank()
+        self.assertEqual(len(self.sent), 1)
+
+    def test_only_the_owner_can_rank(self):
+        self.client.force_authenticate(self.seeker)
+        self.assertEqual(self.client.get(f'/api/rank-applicants/{self.job.id}/').status_code, 403)
+        other = CustomUser.objects.create_user('other', password='x', user_type='company')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/rank-applicants/{self.job.id}/').status_code, 404)
+
+
+class ProcessingQueueTests(TestCase):
+    """run_worker claims queued CVs, retries failures and recovers tasks orphaned by a dead worker"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        company = CustomUser.objects.create_user('acme', password='x', user_type='company')
+        self.seeker = CustomUser.objects.create_user('seeker', password='x')
+        self.job = Job.objects.create(title='Developer', description='-', location='-', posted_by=company)
+        self.sent = []  # cv_paths of each matcher call
+
+    def enqueue(self, name, age_seconds=0):
+        application = Application(job=self.job, applicant=self.seeker)
+        application.cv_file.save(name, ContentFile(name.encode()))
+        task = enqueue_processing(application)
+        ProcessingTask.objects.filter(id=task.id).update(created_at=timezone.now() - timedelta(seconds=age_seconds))
+        return task
+
+    def matcher(self, failing=()):
+        def preprocess(url, json=None, timeout=None):
+            self.sent.append(json['cv_paths'])
+            response = mock.Mock()
+            response.json.return_value = {'results': [
+                {'cv_path': path, 'status': 'failed', 'message': 'CV parse failed'} if path in failing
+                else {'cv_path': path, 'status': 'ready', 'content_hash': 'h'}
+                for path in json['cv_paths']
+            ]}
+            return response
+        return mock.patch('cv_app.tasks.requests.post', side_effect=preprocess)
+
+    def test_claims_oldest_queued_tasks_once(self):
+        newest, middle, oldest = self.enqueue('a.pdf', 0), self.enqueue('b.pdf', 10), self.enqueue('c.pdf', 20)
+        claimed = claim_tasks(limit=2)
+        self.assertEqual({task.id for task in claimed}, {oldest.id, middle.id})
+        self.assertTrue(all(task.status == 'running' and task.attempts == 1 for task in claimed))
+        self.assertEqual([task.id for task in claim_tasks(limit=2)], [newest.id])
+        self.assertEqual(claim_tasks(limit=2), [])
+
+    def test_ready_outcome_finishes_the_task(self):
+        task = self.enqueue('a.pdf')
+        with self.matcher():
+            self.assertEqual(run_once(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'done')
+        application = task.application
+        application.refresh_from_db()
+        self.assertEqual(application.processing_status, 'ready')
+        self.assertIsNotNone(application.processed_at)
+        self.assertEqual(self.sent, [[application.cv_file.path]])
+
+    def test_failures_are_retried_until_attempts_run_out(self):
+        task = self.enqueue('a.pdf')
+        with mock.patch('cv_app.tasks.requests.post', side_effect=requests.ConnectionError('down')):
+            for attempt in range(1, PROCESSING_MAX_ATTEMPTS + 1):
+                self.assertEqual(run_once(), 1)
+                task.refresh_from_db()
+                self.assertEqual(task.attempts, attempt)
+                self.assertIn('Matcher request failed', task.error)
+                expected = 'failed' if attempt == PROCESSING_MAX_ATTEMPTS else 'queued'
+                self.assertEqual(task.status, expected)
+            self.assertEqual(run_once(), 0)
+        application = task.application
+        application.refresh_from_db()
+        self.assertEqual(application.processing_status, 'failed')
+
+    def test_only_the_failed_cv_of_a_batch_is_retried(self):
+        good, bad = self.enqueue('good.pdf', 10), self.enqueue('bad.pdf')
+        with self.matcher(failing={bad.application.cv_file.path}):
+            run_once()
+            run_once()
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.status, good.attempts), ('done', 1))
+        self.assertEqual((bad.status, bad.attempts, bad.error), ('queued', 2, 'CV parse failed'))
+        self.assertEqual(self.sent[-1], [bad.application.cv_file.path])
+
+    def test_stale_running_tasks_are_requeued(self):
+        stale, live = self.enqueue('stale.pdf', 10), self.enqueue('live.pdf')
+        claim_tasks()
+        ProcessingTask.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - timedelta(seconds=PROCESSING_STALE_SECONDS + 1))
+        self.assertEqual(requeue_stale_tasks(), 1)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((stale.status, live.status), ('queued', 'running'))
+
+    def test_run_worker_once_requeues_stale_tasks_and_drains_the_queue(self):
+        stale = self.enqueue('stale.pdf', 10)
+        self.enqueue('queued.pdf')
+        claim_tasks(limit=1)
+        ProcessingTask.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - timedelta(seconds=PROCESSING_STALE_SECONDS + 1))
+        with self.matcher():
+            call_command('run_worker', '--once', stdout=mock.Mock())
+        self.assertEqual(set(ProcessingTask.objects.values_list('status', flat=True)), {'done'})
+
+
+class UserProfileQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeker = CustomUser.objects.create_user('seeker', password='x')
+        for i in range(4):
+            company = CustomUser.objects.create_user(f'company{i}', password='x', user_type='company')
+            job = Job.objects.create(title=f'Job {i}', description='-', location='-', posted_by=company)
+            Application.objects.create(job=job, applicant=cls.seeker)
+
+    def test_applied_jobs_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.seeker)
+        with self.assertNumQueries(1):
+            response = client.get('/api/profile/')
+        self.assertEqual(sorted(job['company'] for job in response.data['applied_jobs']),
+                         ['company0', 'company1', 'company2', 'company3'])
+
+
+class QueryStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin', password='x')
+        cls.company = CustomUser.objects.create_user('acme', password='x', user_type='company')
+        job = Job.objects.create(title='Job', description='-', location='-', posted_by=cls.company)
+        for i in range(4):
+            seeker = CustomUser.objects.create_user(f'seeker{i}', password='x')
+            Application.objects.create(job=job, applicant=seeker)
+
+    def setUp(self):
+        query_stats.reset()
+        self.client = APIClient()
+
+    @override_settings(QUERY_STATS_ENABLED=True)
+    def test_middleware_records_per_url_name(self):
+        self.client.force_authenticate(self.company)
+        self.client.get('/api/company/applications/')
+        self.client.get('/api/company/applications/')
+
+        self.client.force_authenticate(self.admin)
+        report = self.client.get('/api/query-stats/').data['views']['view_company_applications']
+        self.assertEqual(report['requests'], 2)
+        self.assertEqual(report['queries']['max'], 2)
+        self.assertEqual(report['likely_n_plus_one']['requests'], 0)
+        self.assertIsNotNone(report['latency_ms']['p95'])
+
+    def test_disabled_by_default(self):
+        self.client.force_authenticate(self.company)
+        self.client.get('/api/company/applications/')
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/query-stats/').data['views'], {})
+
+    def test_report_is_admin_only(self):
+        self.client.force_authenticate(self.company)
+        self.assertEqual(self.client.get('/api/query-stats/').status_code, 403)
+
+    def test_query_budget_catches_n_plus_one(self):
+        with self.assertRaisesMessage(AssertionError, 'repeated'):
+            with query_budget(10, max_repeats=1):
+                [app.applicant.username for app in Application.objects.all()]
+        with query_budget(1, max_repeats=1):
+            [app.applicant.username for app in Application.objects.select_related('applicant')]
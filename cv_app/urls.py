@@ -48,6 +48,8 @@ urlpatterns = [
     path('api/company/applications/', view_company_applications, name='view_company_applications'),
     path('api/profile/', UserProfileView.as_view(), name='user_profile'),   
     path('api/rank-applicants/<int:job_id>/', views.rank_applicants, name='rank_applicants'),
+    path('api/rankings/<str:ranking_id>/', views.ranking_job_status, name='ranking_job_status'),
+    path('api/query-stats/', views.query_stats_report, name='query_stats'),
 ]
 
 # Serve media files during development
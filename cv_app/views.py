@@ -13,6 +13,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Job, Application
 from .forms import JobPostForm, JobApplicationForm
+from .tasks import enqueue_processing
 
 def home(request):
     return render(request, "cv_app/home.html")
@@ -121,6 +122,7 @@ def apply_job(request, job_id):
             application.job = job
             application.applicant = request.user
             application.save()
+            enqueue_processing(application)
             return redirect('job_list')
     else:
         form = JobApplicationForm()
@@ -157,6 +159,7 @@ def apply_job(request, job_id):
             application.job = job
             application.applicant = request.user
             application.save()
+            enqueue_processing(application)
             return redirect('job_list')
     else:
         form = JobApplicationForm()
@@ -188,6 +191,7 @@ def submit_application(request):
     if serializer.is_valid():
         # ✅ Pass the applicant as a keyword argument
         application = serializer.save(applicant=request.user)
+        enqueue_processing(application)
         return Response(ApplicationSerializer(application).data, status=201)
 
     return Response(serializer.errors, status=400)
@@ -295,18 +299,33 @@ def create_job(request):
     serializer = JobSerializer(job)
     return Response(serializer.data, status=201)
 # views.py
+from django.db.models import Prefetch
+from .pagination import JobCursorPagination
 from .serializers import JobWithApplicationsSerializer  # import the new serializer
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def view_company_applications(request):
+    """
+    The company's jobs with their applications, a cursor-paginated page at
+    a time. Two queries per page: the jobs, then all their applications
+    joined to the applicant. ?fields=id,title,applications.cv_url limits
+    the output to the named fields.
+    """
     user = request.user
     if user.user_type != 'company':
         return Response({'error': 'Only companies can view applications'}, status=403)
 
-    jobs = Job.objects.filter(posted_by=user)
-    serializer = JobWithApplicationsSerializer(jobs, many=True)
-    return Response(serializer.data)
+    jobs = Job.objects.filter(posted_by=user).prefetch_related(
+        Prefetch('applications', queryset=Application.objects.select_related('applicant').order_by('applied_at'))
+    )
+    paginator = JobCursorPagination()
+    page = paginator.paginate_queryset(jobs, request)
+    fields = request.query_params.get('fields')
+    serializer = JobWithApplicationsSerializer(
+        page, many=True, fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    )
+    return paginator.get_paginated_response(serializer.data)
 
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -335,7 +354,7 @@ class UserProfileView(APIView):
         # For job seekers
         if user.user_type == 'job_seeker':
             # Get jobs applied by the job seeker
-            applications = Application.objects.filter(applicant=user)
+            applications = Application.objects.filter(applicant=user).select_related('job__posted_by')
             applied_jobs = [
                 {
                     "id": app.job.id,
@@ -355,8 +374,7 @@ class UserProfileView(APIView):
         # For companies
         elif user.user_type == 'company':
             # Get jobs posted by the company
-            jobs = Job.objects.filter(posted_by=user)
-            posted_jobs = [{"id": job.id, "title": job.title} for job in jobs]
+            posted_jobs = list(Job.objects.filter(posted_by=user).values('id', 'title'))
 
             data = {
                 'name': user.username,
@@ -369,45 +387,216 @@ class UserProfileView(APIView):
 
         return Response(data)
 
+import hashlib
 import requests
+from django.db import transaction
+from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Job, Application
-from .serializers import ApplicationSerializer
+from .models import Job, Application, ApplicationScore, JobRankingState, QueuedRanking
+from .serializers import ApplicationSerializer, ApplicationScoreSerializer
+
+# The matcher reads CVs straight from MEDIA_ROOT, so it must share storage with Django
+MATCHER_URL = settings.MATCHER_URL
+
+SCORE_FIELDS = ['relevance_score', 'similarity', 'combined_score', 'justification',
+                'key_matches', 'missing_requirements', 'soft_skills', 'domain_fit']
+
+
+def ranked_applicants(job):
+    scores = (ApplicationScore.objects.filter(job=job)
+              .select_related('application__applicant')
+              .order_by('-combined_score', '-relevance_score'))
+    return ApplicationScoreSerializer(scores, many=True).data
+
+
+def description_hash(job):
+    return hashlib.sha256(job.description.encode('utf-8')).hexdigest()
+
+
+def rankable_applications(job):
+    """The job's applications with a CV, backfilling content hashes for rows saved before they existed"""
+    applications = list(Application.objects.filter(job=job).exclude(cv_file=''))
+    for app in applications:
+        if not app.cv_sha256:
+            try:
+                app.cv_sha256 = app.compute_cv_sha256()
+            except OSError:
+                continue  # Missing file; the matcher will report it
+            Application.objects.filter(id=app.id).update(cv_sha256=app.cv_sha256)
+    return applications
+
+
+def applications_to_rank(job, applications, refresh=False):
+    """
+    Return (applications, full): everything when the job description
+    changed, nothing was ranked yet or a refresh is forced; otherwise only
+    applications that are new or whose CV changed since the last ranking.
+    """
+    state = JobRankingState.objects.filter(job=job).first()
+    if refresh or state is None or state.description_hash != description_hash(job):
+        return applications, True
+    return [app for app in applications
+            if state.ranked_hashes.get(str(app.id)) != app.cv_sha256], False
+
+
+def match_results(summary):
+    """Scored and prefilter-skipped candidates of a matcher ranking summary"""
+    return summary['results'] + summary.get('skipped', [])
+
+
+def save_rankings(job, applications, results, full=False, ranked_description_hash=None):
+    """
+    Store the matcher's results for the `applications` that were sent,
+    matched back by CV path, and merge them into the job's ranking state.
+    A full ranking replaces every stored score of the job; otherwise only
+    those of `applications` are replaced. Only candidates with a real score,
+    or skipped by the matcher's prefilter, count as ranked; ones scored from
+    a failed analysis, left unscored or missing from `results` get no row
+    and are re-sent next time.
+
+    `ranked_description_hash` is the description the ranking was run
+    against (default: the current one); when the description has changed
+    since, the next request re-ranks everyone.
+    """
+    by_path = {app.cv_file.path: app for app in applications}
+    rows, ranked = [], []
+    for result in results:
+        app = by_path.get(result.get('cv_path'))
+        if app is None:
+            continue
+        status = result.get('status', 'scored')
+        if status == 'skipped':
+            ranked.append(app)
+        if status != 'scored' or result.get('analysis_failed'):
+            continue
+        ranked.append(app)
+        fields = {field: result.get(field) for field in SCORE_FIELDS}
+        fields['justification'] = fields['justification'] or ''
+        fields['domain_fit'] = str(fields['domain_fit'] or '')[:255]
+        for field in ('key_matches', 'missing_requirements', 'soft_skills'):
+            fields[field] = fields[field] or []
+        rows.append(ApplicationScore(application=app, job=job, **fields))
+
+    with transaction.atomic():
+        state = JobRankingState.objects.select_for_update().filter(job=job).first()
+        ranked_hash = ranked_description_hash or description_hash(job)
+        full = full or state is None or state.description_hash != ranked_hash
+        if full:
+            ApplicationScore.objects.filter(job=job).delete()
+            ranked_hashes = {}
+        else:
+            ApplicationScore.objects.filter(application__in=applications).delete()
+            ranked_hashes = state.ranked_hashes
+        ApplicationScore.objects.bulk_create(rows)
+        ranked_hashes.update({str(app.id): app.cv_sha256 for app in ranked})
+        JobRankingState.objects.update_or_create(job=job, defaults={
+            'description_hash': ranked_hash,
+            'ranked_hashes': ranked_hashes,
+            'ranked_at': timezone.now(),
+        })
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 
 def rank_applicants(request, job_id):
-    job = Job.objects.get(id=job_id)
-
-    # First, upload all CVs
-    upload_url = "http://127.0.0.1:8001/upload-cvs"
-    upload_files = []
-    for app in Application.objects.filter(job=job):
-        upload_files.append(('files', open(app.cv_file.path, 'rb')))
-
-    upload_response = requests.post(upload_url, data={'job_id': str(job_id)}, files=upload_files)
-
-    if upload_response.status_code != 200:
-        return Response({'error': 'Failed to upload CVs'}, status=500)
+    """
+    Rank a job's applicants through the matcher service.
+
+    Scores are stored per application and served from the database. Only
+    applications that are new or whose CV changed are sent to the matcher
+    and merged into the stored ranking; a changed job description or
+    ?refresh=1 re-ranks everyone. The matcher is sent media paths, not
+    file contents.
+
+    With ?mode=async the ranking is queued on the matcher and a ranking id
+    is returned straight away; poll ranking_job_status with it.
+    """
+    if request.user.user_type != 'company':
+        return Response({'error': 'Only companies can rank applicants'}, status=403)
 
-    cv_paths = upload_response.json()['cv_paths']
+    job = get_object_or_404(Job, id=job_id, posted_by=request.user)
+    applications, full = applications_to_rank(job, rankable_applications(job), bool(request.GET.get('refresh')))
+    if not applications:
+        return Response({'ranked': ranked_applicants(job)})
 
-    # Now, match candidates
-    match_url = "http://127.0.0.1:8001/match-candidates"
     match_payload = {
+        "job_id": str(job_id),
+        "job_title": job.title,
         "job_description": job.description,
-        "cv_paths": cv_paths
+        "cv_paths": [app.cv_file.path for app in applications]
     }
+    # Keep every applicant sent in the result, not just the matcher's default top 5
+    match_params = {"top_n": max(len(applications), 1)}
+
+    if request.GET.get('mode') == 'async':
+        submit_response = requests.post(f"{MATCHER_URL}/ranking-jobs", json=match_payload, params=match_params)
+        if submit_response.status_code != 202:
+            return Response({'error': 'Failed to queue ranking'}, status=500)
+        queued = QueuedRanking.objects.create(
+            ranking_id=submit_response.json()['id'],
+            job=job,
+            description_hash=description_hash(job),
+            cv_hashes={str(app.id): app.cv_sha256 for app in applications},
+            full=full,
+        )
+        return Response({'ranking_id': queued.ranking_id, 'status': 'queued'}, status=202)
 
-    match_response = requests.post(match_url, json=match_payload)
+    match_response = requests.post(f"{MATCHER_URL}/match-candidates", json=match_payload, params=match_params)
 
     if match_response.status_code == 200:
-        ranked = match_response.json()['results']
-        return Response({'ranked': ranked})
+        save_rankings(job, applications, match_results(match_response.json()), full)
+        return Response({'ranked': ranked_applicants(job)})
     else:
         return Response({'error': 'Failed to rank applicants'}, status=500)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ranking_job_status(request, ranking_id):
+    """
+    Poll a ranking queued by rank_applicants(?mode=async). The result is
+    stored once done, as of what was submitted: the applications and CV
+    hashes sent and the job description at the time.
+    """
+    queued = get_object_or_404(QueuedRanking.objects.select_related('job'),
+                               ranking_id=ranking_id, job__posted_by=request.user)
+    status_response = requests.get(f"{MATCHER_URL}/ranking-jobs/{ranking_id}")
+    if status_response.status_code == 404:
+        return Response({'error': 'Unknown ranking'}, status=404)
+    if status_response.status_code != 200:
+        return Response({'error': 'Failed to fetch ranking status'}, status=500)
+
+    ranking = status_response.json()
+    data = {'ranking_id': ranking_id, 'status': ranking['status'], 'progress': ranking['progress']}
+    if ranking['status'] == 'done':
+        if queued.saved_at is None:
+            result_response = requests.get(f"{MATCHER_URL}/ranking-jobs/{ranking_id}/result")
+            if result_response.status_code != 200:
+                return Response({'error': 'Failed to fetch ranking result'}, status=500)
+            applications = list(Application.objects.filter(id__in=queued.cv_hashes))
+            for app in applications:
+                # Record the CV that was ranked, so one changed since is re-sent next time
+                app.cv_sha256 = queued.cv_hashes[str(app.id)]
+            save_rankings(queued.job, applications, match_results(result_response.json()),
+                          queued.full, queued.description_hash)
+            QueuedRanking.objects.filter(id=queued.id).update(saved_at=timezone.now())
+        data['ranked'] = ranked_applicants(queued.job)
+    elif ranking['status'] == 'failed':
+        data['error'] = ranking['error']
+    return Response(data)
+
+
+from rest_framework.permissions import IsAdminUser
+from .middleware import query_stats
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def query_stats_report(request):
+    """Per URL name request and SQL stats from QueryStatsMiddleware; DELETE resets them"""
+    if request.method == 'DELETE':
+        query_stats.reset()
+        return Response(status=204)
+    return Response({'enabled': settings.QUERY_STATS_ENABLED, 'views': query_stats.snapshot()})
\ No newline at end of file
@@ -2,7 +2,6 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 
 const DJANGO_ORIGIN = 'http://127.0.0.1:8000';
-const FASTAPI_ORIGIN = 'http://127.0.0.1:8001';
 
 function ViewApplications() {
   const [jobs, setJobs] = useState([]);
@@ -16,73 +15,51 @@ function ViewApplications() {
     }
   });
   // ───────────────────────────────────────────────────────────
+  const [nextPage, setNextPage] = useState(null);
   const [error, setError] = useState('');
   const token = localStorage.getItem('access');
   const navigate = useNavigate();
 
-  useEffect(() => {
-    if (!token) {
-      navigate('/login');
-      return;
-    }
-
-    fetch(`${DJANGO_ORIGIN}/api/company/applications/`, {
+  // The API is cursor-paginated: each page carries the URL of the next one
+  const loadJobs = (url, append) => {
+    fetch(url, {
       headers: { Authorization: `Bearer ${token}` },
     })
       .then(res => res.json())
       .then(result => {
-        if (Array.isArray(result)) setJobs(result);
-        else setError(result.error || 'Unexpected error');
+        if (Array.isArray(result.results)) {
+          setJobs(prev => (append ? [...prev, ...result.results] : result.results));
+          setNextPage(result.next);
+        } else setError(result.error || result.detail || 'Unexpected error');
       })
       .catch(err => setError('Failed to fetch applications: ' + err.message));
+  };
+
+  useEffect(() => {
+    if (!token) {
+      navigate('/login');
+      return;
+    }
+
+    loadJobs(`${DJANGO_ORIGIN}/api/company/applications/`, false);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [token, navigate]);
 
   const handleRankApplicants = async (job) => {
     if (!job || !job.applications?.length) return alert('No applications to rank');
 
     try {
-      const formData = new FormData();
-      formData.append('job_id', job.id);
-
-      for (const app of job.applications) {
-        if (!app.cv_url || app.cv_url.trim() === '') {
-          console.warn(`Skipping applicant ${app.applicant_username || app.id} because cv_url is empty or missing.`);
-          continue;
-        }
-
-        let sourceUrl = app.cv_url;
-        if (!sourceUrl.startsWith('http') && !sourceUrl.startsWith('/media/')) {
-          sourceUrl = `/media/${sourceUrl}`;
-        }
-        if (!sourceUrl.startsWith('http')) {
-          sourceUrl = `${DJANGO_ORIGIN}${sourceUrl}`;
-        }
-
-        const res = await fetch(sourceUrl);
-        const blob = await res.blob();
-        const name = sourceUrl.split('/').pop();
-        formData.append('files', new File([blob], name, { type: 'application/pdf' }));
-      }
-
-      const uploadRes = await fetch(`${FASTAPI_ORIGIN}/upload-cvs`, { method: 'POST', body: formData });
-      if (!uploadRes.ok) throw new Error('Upload failed');
-      const { cv_paths } = await uploadRes.json();
-
-      const matchRes = await fetch(`${FASTAPI_ORIGIN}/match-candidates`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          job_title:      job.title,
-          job_description: job.description || '',
-          cv_paths,
-        }),
+      // Django hands the matcher the stored CV paths and keeps the scores,
+      // so repeat clicks are answered from the database
+      const rankRes = await fetch(`${DJANGO_ORIGIN}/api/rank-applicants/${job.id}/`, {
+        headers: { Authorization: `Bearer ${token}` },
       });
-      if (!matchRes.ok) throw new Error('Matching failed');
-      const matchData = await matchRes.json();
+      if (!rankRes.ok) throw new Error('Ranking failed');
+      const { ranked } = await rankRes.json();
 
       // ───── save to state *and* localStorage ────────────────
       setRankings(prev => {
-        const updated = { ...prev, [job.id]: matchData.results };
+        const updated = { ...prev, [job.id]: ranked };
         localStorage.setItem('rankings', JSON.stringify(updated));
         return updated;
       });
@@ -96,13 +73,7 @@ function ViewApplications() {
 
   const getRankForApp = (jobId, app) => {
     const list = rankings[jobId] || [];
-    if (!list.length || !app.cv_url) return null;
-
-    const cvFileName = app.cv_url.split('/').pop(); // extract filename only
-    return list.find(r => {
-      const pathFileName = r.cv_path?.split(/[\\/]/).pop(); // handles / or \
-      return pathFileName && pathFileName === cvFileName;
-    });
+    return list.find(r => r.application_id === app.id);
   };
   return (
     <div className="min-h-screen bg-lightbg text-dark p-8">
@@ -136,7 +107,7 @@ function ViewApplications() {
                   finalCvUrl = `${DJANGO_ORIGIN}${finalCvUrl}`;
                 }
 
-                // ⮕ NEW: get correct ranking by cv_path
+                // ⮕ NEW: get correct ranking by application id
                 const rank = getRankForApp(job.id, app);
 
                 return (
@@ -201,6 +172,15 @@ function ViewApplications() {
           )}
         </div>
       ))}
+
+      {nextPage && (
+        <button
+          onClick={() => loadJobs(nextPage, true)}
+          className="bg-primary text-white px-4 py-2 rounded hover:bg-orange-500 transition"
+        >
+          Load more jobs
+        </button>
+      )}
     </div>
   );
 }
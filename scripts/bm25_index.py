@@ -0,0 +1,154 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ------ Configuration ------
+BM25_DB_PATH = os.path.join("cv_db", "bm25.db")
+BM25_K1 = 1.5  # Term-frequency saturation
+BM25_B = 0.75  # Document-length normalisation
+RRF_K = 60  # Reciprocal rank fusion damping; larger values flatten rank differences
+
+# Keeps technical tokens such as "c#", "c++", "asp.net", ".net" and "node.js" whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9+#]+(?:\.[a-z0-9+#]+)*|\.[a-z]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or our that the "
+    "their this to we will with you your".split()
+)
+
+
+# ------ Text processing ------
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def terms(text: str) -> Counter:
+    """Unigram and bigram counts; bigrams catch phrases like "sql server" and "entity framework" """
+    tokens = tokenize(text)
+    counts = Counter(tokens)
+    counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return counts
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum of weight / (k + rank of d), best first"""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+# ------ Index ------
+class BM25Index:
+    """
+    Inverted index over CV text and extracted skills in a local SQLite file.
+
+    Skills are indexed on top of the CV text, so a listed skill counts
+    more than a passing mention. Postings are keyed by term, so a query
+    only reads the rows for its own terms.
+    """
+
+    def __init__(self, path: str = BM25_DB_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS bm25_docs (
+                   doc_id TEXT PRIMARY KEY,
+                   length INTEGER NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS bm25_postings (
+                   term TEXT NOT NULL,
+                   doc_id TEXT NOT NULL,
+                   tf INTEGER NOT NULL,
+                   PRIMARY KEY (term, doc_id)
+               ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bm25_postings_doc ON bm25_postings(doc_id)")
+        self._conn.commit()
+
+    def _delete(self, doc_ids: List[str]) -> None:
+        """Caller holds the lock"""
+        rows = [(doc_id,) for doc_id in doc_ids]
+        self._conn.executemany("DELETE FROM bm25_postings WHERE doc_id = ?", rows)
+        self._conn.executemany("DELETE FROM bm25_docs WHERE doc_id = ?", rows)
+
+    def add(self, doc_id: str, text: str, skills: Iterable[str] = ()) -> None:
+        self.add_many([(doc_id, text, skills)])
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Iterable[str]]]) -> None:
+        """Index (doc_id, text, skills) tuples, replacing earlier versions of the same ids"""
+        docs, postings = [], []
+        for doc_id, text, skills in documents:
+            counts = terms(text)
+            for skill in skills:
+                counts.update(terms(str(skill)))
+            docs.append((doc_id, sum(counts.values())))
+            postings.extend((term, doc_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._delete([doc_id for doc_id, _ in docs])
+            self._conn.executemany("INSERT INTO bm25_docs (doc_id, length) VALUES (?, ?)", docs)
+            self._conn.executemany(
+                "INSERT INTO bm25_postings (term, doc_id, tf) VALUES (?, ?, ?)", postings
+            )
+            self._conn.commit()
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._delete(list(doc_ids))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM bm25_docs").fetchone()
+            return count
+
+    def search(self, query: str, k: int = 10,
+               candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Top `k` (doc_id, BM25 score) pairs for `query`, best first.
+        `candidates` restricts results to those ids (e.g. a metadata filter).
+        """
+        query_terms = list(terms(query))
+        if not query_terms:
+            return []
+        allowed = set(candidates) if candidates is not None else None
+        placeholders = ",".join("?" * len(query_terms))
+        with self._lock:
+            total_docs, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM bm25_docs"
+            ).fetchone()
+            if not total_docs:
+                return []
+            doc_freqs = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM bm25_postings WHERE term IN ({placeholders}) GROUP BY term",
+                query_terms,
+            ).fetchall())
+            postings = self._conn.execute(
+                f"""SELECT p.term, p.doc_id, p.tf, d.length
+                    FROM bm25_postings p JOIN bm25_docs d ON d.doc_id = p.doc_id
+                    WHERE p.term IN ({placeholders})""",
+                query_terms,
+            ).fetchall()
+
+        scores: Dict[str, float] = {}
+        for term, doc_id, tf, length in postings:
+            if allowed is not None and doc_id not in allowed:
+                continue
+            df = doc_freqs[term]
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
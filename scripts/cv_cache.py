@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# ------ Configuration ------
+CACHE_DB_PATH = os.environ.get("CV_CACHE_DB", "cv_cache.db")
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MiB reads while hashing PDFs
+
+
+# ------ Hashing helpers ------
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Build a cache key from any JSON-serialisable parts"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ------ In-memory cache ------
+class LRUCache:
+    """
+    Bounded in-process LRU cache with the same get/put/stats interface as
+    SQLiteCache, for values that are cheap to keep in RAM but expensive to
+    recompute (e.g. query embeddings).
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ------ SQLite cache ------
+class SQLiteCache:
+    """
+    Small persistent key/value cache backed by one SQLite table.
+
+    Values are stored as JSON. When the table grows past `max_entries`
+    the least recently used rows are evicted; with `ttl_seconds` set, rows
+    older than that are treated as misses and purged.
+    """
+
+    def __init__(self, table: str, path: str = CACHE_DB_PATH, max_entries: int = 10000,
+                 ttl_seconds: Optional[float] = None):
+        self.table = table
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table}(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and self._expired(row[1], now):
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"""INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?)""",
+                (key, json.dumps(value), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every row whose key starts with `prefix`"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _evict(self) -> None:
+        """Drop expired rows, then least recently used rows beyond max_entries (caller holds the lock)"""
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"""DELETE FROM {self.table} WHERE key IN (
+                        SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?
+                    )""",
+                (excess,),
+            )
+            self.evictions += excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            return count
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ------ LLM score cache ------
+class ScoreCache(SQLiteCache):
+    """
+    Memoised score_cv results.
+
+    Keys start with the job description hash, so when a known job's text
+    changes every score computed for its previous text can be dropped in
+    one statement.
+    """
+
+    def __init__(self, table: str = "cv_scores", **kwargs):
+        super().__init__(table, **kwargs)
+        with self._lock:
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {table}_jobs (
+                        job_id TEXT PRIMARY KEY,
+                        job_hash TEXT NOT NULL
+                    )"""
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def job_hash(job_desc: str) -> str:
+        return hashlib.sha256(job_desc.encode()).hexdigest()
+
+    def score_key(self, cv_data: Dict, job_desc: str, *parts: Any) -> str:
+        """Key for a score: job hash prefix + hash of the CV record and scoring parameters"""
+        return f"{self.job_hash(job_desc)}:{make_key(cv_data, *parts)}"
+
+    def track_job(self, job_id: str, job_desc: str) -> int:
+        """Record the job's current text; drop scores cached for its previous text"""
+        new_hash = self.job_hash(job_desc)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT job_hash FROM {self.table}_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table}_jobs (job_id, job_hash) VALUES (?, ?)",
+                (job_id, new_hash),
+            )
+            self._conn.commit()
+        if row is None or row[0] == new_hash:
+            return 0
+        return self.delete_prefix(f"{row[0]}:")
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# ------ Configuration ------
+INITIAL_CAPACITY = 1024  # Rows allocated up front; the matrix doubles when full
+
+
+def read_key_log(path: str) -> List[str]:
+    """Lines of a key log, dropping a partial last line left by an interrupted append"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    return data[:complete].decode().splitlines()
+
+
+def append_key_log(path: str, lines: List[str]) -> None:
+    if lines:
+        with open(path, "a") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding matrix keyed by content hash.
+
+    Vectors are L2-normalised on write and kept in a memory-mapped float32
+    file, so comparing a query with a pool of CVs is one matrix-vector
+    product over the stored rows. Keys are appended to a log, one per line,
+    in row order, so a write costs the size of the batch rather than of the
+    store; a small JSON index records the dimension and allocated rows.
+    """
+
+    def __init__(self, directory: str, dim: int, initial_capacity: int = INITIAL_CAPACITY):
+        self.directory = directory
+        self.dim = dim
+        self.matrix_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.json")
+        self.keys_path = os.path.join(directory, "keys.log")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._rows: Dict[str, int] = {}
+        capacity = initial_capacity
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index["dim"] != dim:
+                raise ValueError(
+                    f"Embedding store at {directory} has dim {index['dim']}, expected {dim}"
+                )
+            capacity = max(index["capacity"], initial_capacity)
+            self._rows = {key: row for row, key in enumerate(read_key_log(self.keys_path))}
+        self._open(capacity)
+        if not os.path.exists(self.index_path):
+            self._write_index()
+
+    # ------ Storage ------
+    def _open(self, capacity: int) -> None:
+        """(Re)map the matrix file, growing it to `capacity` rows if needed"""
+        size = capacity * self.dim * np.dtype(np.float32).itemsize
+        with open(self.matrix_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.capacity = capacity
+        self._vectors = np.memmap(
+            self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def _write_index(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self.index_path)
+
+    # ------ Public API ------
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: str) -> np.ndarray:
+        """Return the normalised vector stored for `key`"""
+        with self._lock:
+            return np.array(self._vectors[self._rows[key]])
+
+    def put(self, key: str, vector: Sequence[float]) -> None:
+        self.put_many([key], [vector])
+
+    def put_many(self, keys: List[str], vectors) -> None:
+        """Normalise and store vectors, overwriting existing rows for known keys"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            new_keys = [k for k in dict.fromkeys(keys) if k not in self._rows]
+            needed = len(self._rows) + len(new_keys)
+            if needed > self.capacity:
+                capacity = self.capacity
+                while capacity < needed:
+                    capacity *= 2
+                self._vectors.flush()
+                self._open(capacity)
+                self._write_index()
+            for key in new_keys:
+                self._rows[key] = len(self._rows)
+            for key, vector in zip(keys, vectors):
+                self._vectors[self._rows[key]] = vector
+            self._vectors.flush()
+            # Keys are logged only once their vectors are on disk
+            append_key_log(self.keys_path, new_keys)
+
+    def similarities(self, query: Sequence[float], keys: List[str]) -> np.ndarray:
+        """Cosine similarity of `query` against the stored vectors of `keys`"""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        query = query / (np.linalg.norm(query) or 1)
+        if not keys:
+            return np.empty(0, dtype=np.float32)
+        with self._lock:
+            rows = np.fromiter((self._rows[k] for k in keys), dtype=np.int64, count=len(keys))
+            matrix = self._vectors[rows]
+        return matrix @ query
@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Dict, Optional, Set
+
+# ------ Configuration ------
+MANIFEST_PATH = os.path.join("cv_db", "manifest.json")
+
+
+class IngestManifest:
+    """
+    Record of what has been ingested into the CV collection.
+
+    Each entry maps a file path to its content hash, size, mtime, Chroma
+    document id and the model/prompt versions it was processed with, so a
+    re-index can tell unchanged, renamed, changed and deleted files apart.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)["files"]
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, file_path: str) -> Optional[Dict]:
+        return self.entries.get(file_path)
+
+    def is_unchanged(self, file_path: str, versions: Dict) -> bool:
+        """True if size, mtime and versions all match the recorded entry (no hashing needed)"""
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        return (entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime
+                and entry["versions"] == versions)
+
+    def find_by_hash(self, content_hash: str, versions: Dict) -> Optional[Dict]:
+        """An entry with this content processed under the same versions, if any"""
+        for entry in self.entries.values():
+            if entry["content_hash"] == content_hash and entry["versions"] == versions:
+                return entry
+        return None
+
+    def record(self, file_path: str, content_hash: str, doc_id: str, versions: Dict) -> None:
+        stat = os.stat(file_path)
+        self.entries[file_path] = {
+            "content_hash": content_hash,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "doc_id": doc_id,
+            "versions": versions,
+        }
+
+    def remove(self, file_path: str) -> Optional[Dict]:
+        return self.entries.pop(file_path, None)
+
+    def doc_ids(self) -> Set[str]:
+        return {entry["doc_id"] for entry in self.entries.values()}
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+_registry: List["LazyResource"] = []
+
+
+class LazyResource:
+    """
+    Thread-safe lazy singleton for an expensive resource (model, client,
+    database handle).
+
+    The factory runs once, on first use, behind a lock; concurrent first
+    callers wait for that one load instead of starting their own. The
+    proxy forwards attribute access, calls, `in` and `len()` to the loaded
+    object, so it can stand in for the resource itself.
+    """
+
+    def __init__(self, resource_name: str, factory: Callable[[], Any]):
+        self._resource_name = resource_name
+        self._factory = factory
+        self._instance = None
+        self._loaded = False
+        self._load_seconds = None
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def load(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self._load_seconds = time.perf_counter() - started
+                    self._loaded = True
+                    print(f"Loaded {self._resource_name} in {self._load_seconds:.2f}s")
+        return self._instance
+
+    def status(self) -> Dict[str, Any]:
+        return {"loaded": self._loaded, "load_seconds": self._load_seconds}
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __contains__(self, item) -> bool:
+        return item in self.load()
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+
+def warm_up(*resources: LazyResource) -> Dict[str, Dict[str, Any]]:
+    """Load the given resources (all registered ones if none are given) and report their load times"""
+    for resource in resources or tuple(_registry):
+        resource.load()
+    return resource_status()
+
+
+def resource_status() -> Dict[str, Dict[str, Any]]:
+    return {resource._resource_name: resource.status() for resource in _registry}
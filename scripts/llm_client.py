@@ -0,0 +1,200 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Union
+
+import requests
+
+# ------ Configuration ------
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+LLM_MAX_TOKENS = 1024  # Default cap on generated tokens per call
+LLM_TIMEOUT_SECONDS = 300
+
+# JSON schemas the backend constrains generation to
+CV_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "email": {"type": "string"},
+        "technical_skills": {"type": "array", "items": {"type": "string"}},
+        "soft_skills": {"type": "array", "items": {"type": "string"}},
+        "experience": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "role": {"type": "string"},
+                    "company": {"type": "string"},
+                    "years": {"type": "number"},
+                },
+                "required": ["role", "company", "years"],
+            },
+        },
+        "education": {"type": "string"},
+    },
+    "required": ["name", "email", "technical_skills", "soft_skills", "experience", "education"],
+}
+
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "relevance_score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "justification": {"type": "string"},
+        "key_matches": {"type": "array", "items": {"type": "string"}},
+        "missing_requirements": {"type": "array", "items": {"type": "string"}},
+        "soft_skills": {"type": "array", "items": {"type": "string"}},
+        "domain_fit": {"type": "string"},
+    },
+    "required": ["relevance_score", "justification", "key_matches",
+                 "missing_requirements", "soft_skills", "domain_fit"],
+}
+
+
+# ------ Tolerant JSON parsing ------
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+_FENCED_BLOCK = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+_BARE_WORDS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _repair(text: str) -> str:
+    """
+    Rewrite near-JSON into JSON: drop comments, convert single quotes and
+    Python literals, remove trailing commas, ignore text after the top-level
+    value, and close strings/brackets left open by a truncated generation.
+    """
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("no JSON object or array")
+    out: List[str] = []
+    stack: List[str] = []
+    cut_points = []  # (output length, open brackets) after each complete value, for backing off
+    i, quote = start, None
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(text):
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':  # Double quote inside a single-quoted string
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1].strip() in ("", ","):  # Trailing commas
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            cut_points.append((len(out), list(stack)))
+        elif ch == ",":
+            cut_points.append((len(out), list(stack)))
+            out.append(ch)
+        elif text.startswith("//", i) or ch == "#":
+            newline = text.find("\n", i)
+            i = len(text) if newline < 0 else newline
+            continue
+        elif ch.isalpha():
+            word = re.match(r"[A-Za-z_][A-Za-z0-9_]*", text[i:]).group(0)
+            i += len(word)
+            if text[i:].lstrip().startswith(":"):  # Unquoted key
+                out.append(f'"{word}"')
+            else:
+                out.append(_BARE_WORDS.get(word, word))
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if not stack and quote is None:
+        return "".join(out)
+
+    # Truncated: close what is open, backing off to earlier complete values if needed
+    attempts = [(len(out), list(stack), quote is not None)]
+    attempts += [(length, brackets, False) for length, brackets in reversed(cut_points)]
+    for length, brackets, in_string in attempts:
+        candidate = "".join(out[:length]) + ('"' if in_string else "")
+        candidate = candidate.rstrip().rstrip(",")
+        if candidate.endswith(":"):
+            candidate += " null"
+        candidate += "".join(_CLOSERS[b] for b in reversed(brackets))
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+    raise ValueError("could not close truncated JSON")
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parse JSON out of an LLM response, salvaging near-valid output:
+    reasoning blocks and prose are skipped, fenced blocks are preferred,
+    and small syntax slips or truncation are repaired. Raises ValueError
+    if nothing usable is found.
+    """
+    text = _THINK_BLOCK.sub("", text or "")
+    candidates = [block for block in _FENCED_BLOCK.findall(text) if block.strip()]
+    candidates.append(text)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate.strip())
+        except ValueError:
+            pass
+        try:
+            return json.loads(_repair(candidate))
+        except ValueError:
+            continue
+    raise ValueError(f"No JSON found in LLM response: {text[:200]!r}")
+
+
+# ------ Ollama structured output ------
+_models_without_thinking = set()
+
+
+def generate_json(model: str, prompt: str, schema: Optional[Union[Dict, str]] = "json",
+                  max_tokens: int = LLM_MAX_TOKENS, temperature: float = 0,
+                  context_tokens: Optional[int] = None) -> Any:
+    """
+    Generate with Ollama constrained to `schema` (a JSON schema, or "json"
+    for any JSON), at most `max_tokens` generated tokens and reasoning
+    output switched off where the model supports that. The response is
+    parsed with repair_json, so output cut off by the token cap is still
+    salvaged when possible. `context_tokens` sets the context window
+    (num_ctx); Ollama's default is small and silently cuts longer prompts.
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "format": schema,
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+    }
+    if context_tokens:
+        payload["options"]["num_ctx"] = context_tokens
+    if model not in _models_without_thinking:
+        payload["think"] = False
+    response = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=LLM_TIMEOUT_SECONDS)
+    if response.status_code == 400 and "think" in response.text.lower() and "think" in payload:
+        # Models (or servers) without a thinking switch reject the flag
+        _models_without_thinking.add(model)
+        payload.pop("think")
+        response = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=LLM_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return repair_json(response.json()["response"])
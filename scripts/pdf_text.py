@@ -0,0 +1,211 @@
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, List
+
+# ------ Configuration ------
+EXTRACTION_BACKEND = "pymupdf"  # "pymupdf" (fast) or "pdfplumber"
+EXTRACTION_WORKERS = os.cpu_count() or 1
+EXTRACTION_TIMEOUT_SECONDS = 30  # Per file
+MIN_TEXT_CHARS = 50  # Results shorter than this are retried with the other backend
+
+
+# ------ Backends ------
+def extract_with_pymupdf(pdf_path: str) -> str:
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return "\n".join(page.get_text() for page in doc)
+
+def extract_with_pdfplumber(pdf_path: str) -> str:
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return "\n".join(page.extract_text() or "" for page in pdf.pages)
+
+BACKENDS: Dict[str, Callable[[str], str]] = {
+    "pymupdf": extract_with_pymupdf,
+    "pdfplumber": extract_with_pdfplumber,
+}
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def extract_text(pdf_path: str, backend: str = EXTRACTION_BACKEND) -> str:
+    """
+    Extract raw text from a PDF with `backend`.
+
+    If that backend fails or returns (almost) nothing, the other backends
+    are tried and the longest text wins.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}'")
+
+    best, last_error = "", None
+    for name in [backend, *(b for b in BACKENDS if b != backend)]:
+        try:
+            text = BACKENDS[name](pdf_path)
+        except ExtractionTimeout:
+            raise
+        except Exception as e:
+            last_error = e
+            continue
+        if len(text.strip()) >= MIN_TEXT_CHARS:
+            return text
+        if len(text.strip()) > len(best.strip()):
+            best = text
+    if not best and last_error is not None:
+        raise last_error
+    return best
+
+
+# ------ Process pool ------
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+def _extract_worker(pdf_path: str, backend: str, timeout: float) -> str:
+    """Runs in a pool process; an alarm interrupts pathological files"""
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(math.ceil(timeout))
+    try:
+        return extract_text(pdf_path, backend)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+def new_pool(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Workers start from a fork server (spawn where unavailable), never by
+    forking the caller: that is a web server process with live threads
+    and loaded models, and forking it from a worker thread can deadlock.
+    This module is light, so it is all the fork server preloads. Workers
+    re-import the launching script, which must keep its startup under
+    `if __name__ == "__main__":` (process_cvs.py does).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload([__name__])
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def kill_pool(pool: concurrent.futures.ProcessPoolExecutor) -> None:
+    """Tear down a pool without waiting, killing workers stuck on a file"""
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+_pool = None
+_pool_lock = threading.Lock()
+_queued = 0  # Files submitted to the shared pool and not finished yet
+
+def get_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    The shared pool, started on first use and kept for the life of the
+    process, so worker start-up is paid once rather than per call
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = new_pool(EXTRACTION_WORKERS)
+        return _pool
+
+def discard_pool(pool: concurrent.futures.ProcessPoolExecutor) -> None:
+    """Kill a stalled or broken pool unless another call already replaced it; the next get_pool() starts afresh"""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    kill_pool(pool)
+
+def _task_done(future: concurrent.futures.Future) -> None:
+    global _queued
+    with _pool_lock:
+        _queued -= 1
+
+
+def _extract_batch(pdf_paths: List[str], backend: str, timeout: float,
+                   results: Dict[str, Dict], retry: bool) -> List[str]:
+    """
+    Extract `pdf_paths` on the shared pool into `results`. With `retry`,
+    files lost because the pool was torn down under them (another call's
+    stall, or a crash) are returned instead of failed, to run again.
+    """
+    global _queued
+    pool = get_pool()
+    with _pool_lock:
+        queued = _queued
+    futures, lost = {}, []
+    for path in pdf_paths:
+        try:
+            future = pool.submit(_extract_worker, path, backend, timeout)
+        except RuntimeError:  # Shut down (or broken) since get_pool()
+            lost.append(path)
+            continue
+        with _pool_lock:
+            _queued += 1
+        future.add_done_callback(_task_done)
+        futures[future] = path
+
+    # Alarms bound each file inside its worker; this is the backstop for
+    # workers that cannot be interrupted (e.g. stuck inside C code). Files
+    # queued by concurrent calls run first, so they count towards it.
+    waves = math.ceil((queued + len(futures)) / EXTRACTION_WORKERS)
+    backstop = time.monotonic() + timeout * (waves + 1)
+
+    stalled = broken = False
+    for future, path in futures.items():
+        try:
+            text = future.result(timeout=max(0.0, backstop - time.monotonic()))
+            results[path] = {"status": "success", "text": text}
+        except ExtractionTimeout:
+            results[path] = {"status": "error", "message": f"Extraction timed out after {timeout}s"}
+        except concurrent.futures.TimeoutError:
+            results[path] = {"status": "error", "message": f"Extraction timed out after {timeout}s"}
+            stalled = True
+        except (concurrent.futures.process.BrokenProcessPool, concurrent.futures.CancelledError) as e:
+            broken = True
+            if retry:
+                lost.append(path)
+            else:
+                results[path] = {"status": "error", "message": f"Extraction worker crashed: {e or 'pool shut down'}"}
+        except Exception as e:
+            results[path] = {"status": "error", "message": str(e)}
+    if stalled or broken:
+        discard_pool(pool)
+    if not retry:
+        for path in lost:
+            results[path] = {"status": "error", "message": "Extraction pool shut down"}
+        return []
+    return lost
+
+
+def extract_texts(pdf_paths: List[str], backend: str = EXTRACTION_BACKEND,
+                  timeout: float = EXTRACTION_TIMEOUT_SECONDS) -> Dict[str, Dict]:
+    """
+    Extract many PDFs in parallel worker processes.
+
+    Returns {path: {"status": "success", "text": ...}} or
+    {path: {"status": "error", "message": ...}} for every input path.
+
+    All calls share one long-lived pool. A stalled file gets the pool
+    killed and replaced; files of concurrent calls that were lost with it
+    are run once more on the new pool.
+    """
+    results: Dict[str, Dict] = {}
+    pending = list(pdf_paths)
+    for retry in (True, False):
+        if not pending:
+            break
+        pending = _extract_batch(pending, backend, timeout, results, retry)
+    return results
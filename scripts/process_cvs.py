@@ -1,23 +1,31 @@
-import pdfplumber
 import os
 import glob
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from langchain_community.llms import Ollama
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Literal, Optional
 import json
 import hashlib
+import asyncio
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.concurrency import run_in_threadpool
 import concurrent.futures
+import threading
 from fastapi import UploadFile, File ,Form
 import tempfile
-import torch  # Add this import
+import shutil
+from cv_cache import SQLiteCache, ScoreCache, file_sha256, make_key
+from embedding_store import EmbeddingStore
+from lazy_resources import LazyResource, resource_status, warm_up
+from llm_client import CV_SCHEMA, SCORE_SCHEMA, generate_json, repair_json
+from pdf_text import EXTRACTION_BACKEND, extract_text, extract_texts
+from ranking_jobs import RankingJobQueue
+from rubric_scorer import normalise_requirements, requirements_from_text
+import rubric_scorer
 
 # d_main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 app = FastAPI()
 
@@ -37,17 +45,74 @@ app.add_middleware(
 
 # … rest of your routes …
 
-# ------ Configuration ------
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {DEVICE}")
 # ------ Configuration ------
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 LLM_MODEL = "mistral:7b-instruct-q4_K_M"
-MAX_WORKERS = 4  # For multithreading
+STRUCTURED_OUTPUT = False  # Schema-constrained JSON from Ollama, with token caps and no reasoning output
+PARSE_MAX_TOKENS = 1024  # Generated-token cap per parse_cv call in structured mode
+SCORE_MAX_TOKENS = 512  # Generated-token cap per candidate scored in structured mode
+MAX_WORKERS = 4  # Threads for LLM parsing (text extraction uses the pdf_text process pool)
+PARSE_PROMPT_VERSION = "1"  # Bump whenever the parse_cv prompt changes
+PARSE_CACHE_MAX_ENTRIES = 20000
+EMBEDDING_STORE_DIR = "embedding_store"
+EMBED_BATCH_SIZE = 32  # Texts per encoder forward pass
+SCORE_PROMPT_VERSION = "1"  # Bump whenever the score_cv prompt changes
+SCORE_CACHE_MAX_ENTRIES = 50000
+SCORE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+REQUIREMENTS_PROMPT_VERSION = "1"  # Bump whenever the extract_job_requirements prompt changes
+LLM_CONTEXT_TOKENS = 8192  # Context window requested from Ollama (num_ctx); bounds how many CVs share one scoring prompt
+SCORE_BATCH_MAX_CANDIDATES = 8
+SCORE_OUTPUT_TOKENS_PER_CANDIDATE = 250  # Room reserved for each candidate's JSON answer
+CHARS_PER_TOKEN = 4  # Rough prompt-size estimate; no tokenizer needed
+SCORING_CONCURRENCY = 4  # In-flight Ollama calls across the process (parsing, scoring, ranking jobs); match OLLAMA_NUM_PARALLEL
+RANKING_WORKERS = 2  # Ranking jobs processed at once by the background workers
+RANKING_POLL_SECONDS = 5
+UPLOAD_DIR = "uploaded_cvs"
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read per chunk while streaming uploads to disk
+WARM_UP_ON_STARTUP = True  # Load models before serving so first requests don't pay for it
+
+# Initialize components with GPU support (heavy ones load lazily, see warm_up)
+def load_embedder():
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    return SentenceTransformer(EMBEDDING_MODEL).to(device)  # Move model to GPU
+
+def load_llm():
+    from langchain_community.llms import Ollama
+
+    return Ollama(model=LLM_MODEL, temperature=0, num_ctx=LLM_CONTEXT_TOKENS)
+
+def load_embedding_store():
+    return EmbeddingStore(
+        os.path.join(EMBEDDING_STORE_DIR, EMBEDDING_MODEL.replace("/", "__")),
+        dim=embedder.get_sentence_embedding_dimension(),
+    )
+
+# Every LLM call takes a slot, so concurrent requests, ranking jobs and
+# parse threads together never have more than SCORING_CONCURRENCY in flight
+llm_slots = threading.BoundedSemaphore(SCORING_CONCURRENCY)
 
-# Initialize components with GPU support
-embedder = SentenceTransformer(EMBEDDING_MODEL).to(DEVICE)  # Move model to GPU
-llm = Ollama(model=LLM_MODEL, temperature=0)
+def llm_json(prompt: str, schema: Any = "json", max_tokens: int = PARSE_MAX_TOKENS) -> Any:
+    """
+    Run a JSON-producing prompt: schema-constrained and token-capped with
+    STRUCTURED_OUTPUT, otherwise a plain generation. Either way the text is
+    parsed tolerantly (raises ValueError if nothing can be salvaged).
+    """
+    with llm_slots:
+        if STRUCTURED_OUTPUT:
+            return generate_json(LLM_MODEL, prompt, schema, max_tokens, context_tokens=LLM_CONTEXT_TOKENS)
+        text = llm.invoke(prompt)
+    return repair_json(text)
+
+embedder = LazyResource("embedder", load_embedder)
+llm = LazyResource("llm", load_llm)
+embedding_store = LazyResource("embedding_store", load_embedding_store)
+parse_cache = SQLiteCache("parsed_cvs", max_entries=PARSE_CACHE_MAX_ENTRIES)
+score_cache = ScoreCache(max_entries=SCORE_CACHE_MAX_ENTRIES, ttl_seconds=SCORE_CACHE_TTL_SECONDS)
+ranking_jobs = RankingJobQueue()
 
 
 # ------ Data Models ------
@@ -63,43 +128,113 @@ class CVData(BaseModel):
     soft_skills: List[str]
     experience: List[CVExperience]
     education: str
-    embedding: List[float]  # Added embedding storage
+    content_hash: str  # Row key in the embedding store
 
 class JobRequest(BaseModel):
     job_title: str
     job_description: str
     cv_paths: List[str]
+    job_id: Optional[str] = None  # Lets cached scores be dropped when this job's text changes
 
-# ------ Core Functions ------
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+class PreprocessRequest(BaseModel):
+    cv_paths: List[str]
+
+class RankingOptions(BaseModel):
+    tech_weight: float = 0.7
+    soft_weight: float = 0.3
+    top_n: int = 5
+    embed_batch_size: int = EMBED_BATCH_SIZE
+    max_in_flight: int = SCORING_CONCURRENCY
+    deadline_seconds: Optional[float] = None
+    prefilter_k: Optional[int] = None
+    batch_scoring: bool = False  # Pack several CVs into each score_cv prompt
+    scorer: Literal["llm", "rubric"] = "llm"  # "rubric" scores locally from extracted job requirements
+    llm_top_k: Optional[int] = None  # With the rubric scorer, LLM-written justifications for the top k
 
 # ------ Modified GPU Functions ------
-def process_single_cv(cv_path: str) -> Dict:
-    """Process CV with GPU support"""
+def lookup_cv(cv_path: str) -> Dict:
+    """Hash a CV and look up what is already cached for its content"""
     try:
-        print(f"Processing {cv_path} on {DEVICE}...")
-        text = extract_text_from_pdf(cv_path)
-        if not text.strip():
-            return {"status": "error", "message": "Empty or image-only PDF", "path": cv_path}
-        cv_data = parse_cv(text)
-        
-        # GPU-accelerated embedding
-        with torch.no_grad():
-            cv_data["embedding"] = embedder.encode(text, device=DEVICE, convert_to_tensor=True).cpu().numpy().tolist()
-            
-        return {"status": "success", "data": cv_data, "path": cv_path}
+        content_hash = file_sha256(cv_path)
+    except OSError as e:
+        return {"status": "error", "message": str(e), "path": cv_path}
+    return {
+        "status": "pending",
+        "path": cv_path,
+        "content_hash": content_hash,
+        "data": parse_cache.get(parse_cache_key(content_hash)),
+        "needs_embedding": content_hash not in embedding_store,
+    }
+
+def process_single_cv(entry: Dict, text: str = None) -> Dict:
+    """
+    Parse a looked-up CV from its extracted text when the parse is not cached.
+
+    Embedding is left to embed_pending_cvs so all texts go through the
+    encoder in batches; results that still need one carry their "text".
+    """
+    cv_path = entry["path"]
+    try:
+        result = {"status": "success", "data": entry["data"], "path": cv_path,
+                  "content_hash": entry["content_hash"]}
+        if entry["data"] is None or entry["needs_embedding"]:
+            if not text or not text.strip():
+                return {"status": "error", "message": "Empty or image-only PDF", "path": cv_path}
+            if entry["data"] is None:
+                print(f"Parsing {cv_path}...")
+                result["data"] = parse_and_cache_cv(entry["content_hash"], text)
+            if entry["needs_embedding"]:
+                result["text"] = text
+        return result
     except Exception as e:
         print(f"⚠️  CV failed: {cv_path} → {e}")
         return {"status": "error", "message": str(e), "path": cv_path}
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    with pdfplumber.open(pdf_path) as pdf:
-        texts = []
-        for page in pdf.pages:
-            t = page.extract_text() or ''   # <- fall back to empty string
-            texts.append(t)
-        return "\n".join(texts)
+def embed_texts(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed texts in length-sorted batches so each forward pass pads as little as possible"""
+    vectors = np.empty((len(texts), embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        vectors[batch] = embedder.encode(
+            [texts[i] for i in batch], batch_size=batch_size, convert_to_numpy=True
+        )
+    return vectors
+
+def embed_pending_cvs(results: List[Dict], job_description: Optional[str] = None,
+                      batch_size: int = EMBED_BATCH_SIZE) -> Optional[np.ndarray]:
+    """
+    Embed every CV text still missing from the embedding store together
+    with the job description, and return the job embedding (None when no
+    job description is given, e.g. when pre-processing on submission).
+    """
+    pending = {}
+    for result in results:
+        text = result.pop("text", None)
+        if text is not None:
+            pending[result["content_hash"]] = text
+
+    texts = list(pending.values()) if job_description is None else [job_description, *pending.values()]
+    if not texts:
+        return None
+    vectors = embed_texts(texts, batch_size)
+    if pending:
+        embedding_store.put_many(list(pending), vectors[-len(pending):])
+    return None if job_description is None else vectors[0]
+
+def extract_text_from_pdf(pdf_path: str, backend: str = EXTRACTION_BACKEND) -> str:
+    return extract_text(pdf_path, backend)
+
+def parse_cache_key(content_hash: str) -> str:
+    """Cache key for a parsed CV: PDF content hash + model + prompt version"""
+    return make_key(content_hash, LLM_MODEL, PARSE_PROMPT_VERSION)
+
+def parse_and_cache_cv(content_hash: str, pdf_text: str) -> Dict:
+    """Run parse_cv and store the result in the persistent parse cache"""
+    cv_data = parse_cv(pdf_text)
+    if cv_data != parse_fallback():  # Never cache failed parses
+        parse_cache.put(parse_cache_key(content_hash), cv_data)
+    return cv_data
 
 def parse_cv(pdf_text: str) -> Dict:
     """Convert raw CV text to structured data using LLM with both hard and soft skills extraction"""
@@ -125,33 +260,23 @@ def parse_cv(pdf_text: str) -> Dict:
     For technical_skills, extract hard/technical/domain-specific skills relevant to any industry.
     For soft_skills, extract interpersonal abilities, traits and transferable skills.
     """
-    response = llm.invoke(prompt)
     try:
-        return json.loads(response.split("```json")[1].split("```")[0].strip())
-    except:
-        return {
-            "name": "Unknown",
-            "email": "unknown@example.com",
-            "technical_skills": [],
-            "soft_skills": [],
-            "experience": [],
-            "education": ""
-        }
+        return llm_json(prompt, CV_SCHEMA, PARSE_MAX_TOKENS)
+    except Exception as e:
+        print(f"CV parsing failed: {str(e)}")
+        return parse_fallback()
 
-def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight: float = 0.3) -> Dict:
-    """
-    Generate weighted score and analysis for candidates across multiple industries
-    
-    Parameters:
-        cv_data: Dictionary containing CV information
-        job_desc: String describing the job requirements
-        tech_weight: Weight for technical/hard skills (default 0.7 or 70%)
-        soft_weight: Weight for soft skills (default 0.3 or 30%)
-    """
-    prompt = f"""
-    You are an expert CV-to-Job matching system. Analyze the following CV against the job description and:
+def parse_fallback():
+    return {
+        "name": "Unknown",
+        "email": "unknown@example.com",
+        "technical_skills": [],
+        "soft_skills": [],
+        "experience": [],
+        "education": ""
+    }
 
-    1. Assign a relevance score (0-100), broken down as follows:
+SCORING_RUBRIC = """    1. Assign a relevance score (0-100), broken down as follows:
        - Hard skills match (50% weight):
          - Required skills: 70% of this category
          - Bonus/nice-to-have skills: 30% of this category
@@ -170,8 +295,48 @@ def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight
          - Has relevant experience in target domain: 100%
          - Adjacent/related domain: 50%
          - Irrelevant or no domain context: 0%
-       - Soft skills / role fit indicators (5% weight)
+       - Soft skills / role fit indicators (5% weight)"""
+
+def candidate_summary(cv_data: Dict) -> str:
+    """The CV fields shown to the LLM when scoring"""
+    return f"""    - Name: {cv_data.get('name', 'Unknown')}
+    - Technical Skills: {', '.join(cv_data.get('technical_skills', []))}
+    - Soft Skills: {', '.join(cv_data.get('soft_skills', []))}
+    - Experience: {json.dumps(cv_data.get('experience', []), indent=2)}
+    - Education: {cv_data.get('education', '')}"""
+
+def normalise_score(result: Dict) -> Dict:
+    """Coerce one LLM score object into the score_cv schema"""
+    # Robust list handling with type checking
+    def safe_get_list(data, key, max_items=None):
+        items = data.get(key, [])
+        if not isinstance(items, list):
+            items = [items] if items else []
+        return items[:max_items] if max_items else items
+
+    return {
+        "relevance_score": int(result.get("relevance_score", 0)),
+        "justification": str(result.get("justification", "Analysis incomplete")),
+        "key_matches": safe_get_list(result, "key_matches", 5) or ["None"],
+        "missing_requirements": safe_get_list(result, "missing_requirements", 5),
+        "soft_skills": safe_get_list(result, "soft_skills", 3),
+        "domain_fit": str(result.get("domain_fit", "None"))
+    }
 
+def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight: float = 0.3) -> Dict:
+    """
+    Generate weighted score and analysis for candidates across multiple industries
+    
+    Parameters:
+        cv_data: Dictionary containing CV information
+        job_desc: String describing the job requirements
+        tech_weight: Weight for technical/hard skills (default 0.7 or 70%)
+        soft_weight: Weight for soft skills (default 0.3 or 30%)
+    """
+    prompt = f"""
+    You are an expert CV-to-Job matching system. Analyze the following CV against the job description and:
+
+{SCORING_RUBRIC}
     2. List:
        - Matched skills (required and bonus)
        - Missing or weak requirements
@@ -182,11 +347,7 @@ def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight
     Job Description: {job_desc}
 
     CV Data:
-    - Name: {cv_data.get('name', 'Unknown')}
-    - Technical Skills: {', '.join(cv_data.get('technical_skills', []))}
-    - Soft Skills: {', '.join(cv_data.get('soft_skills', []))}
-    - Experience: {json.dumps(cv_data.get('experience', []), indent=2)}
-    - Education: {cv_data.get('education', '')}
+{candidate_summary(cv_data)}
 
     Output format:
     ```json
@@ -208,47 +369,197 @@ def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight
     """
     
     try:
-        response = llm.invoke(prompt)
-        
-        # Enhanced JSON extraction with multiple fallbacks
-        json_str = None
-        try:
-            # First try standard extraction
-            json_str = response.split("```json")[1].split("```")[0].strip()
-        except IndexError:
-            # Fallback: look for any JSON block
-            json_blocks = [b for b in response.split("```") if b.strip().startswith('{')]
-            if json_blocks:
-                json_str = json_blocks[0].strip('json').strip()
-
-        # Final fallback: try parsing entire response as JSON
-        if not json_str:
-            json_str = response.strip()
-
-        result = json.loads(json_str)
-
-        # Robust list handling with type checking
-        def safe_get_list(data, key, max_items=None):
-            items = data.get(key, [])
-            if not isinstance(items, list):
-                items = [items] if items else []
-            return items[:max_items] if max_items else items
-
-        return {
-            "relevance_score": int(result.get("relevance_score", 0)),
-            "justification": str(result.get("justification", "Analysis incomplete")),
-            "key_matches": safe_get_list(result, "key_matches", 5) or ["None"],
-            "missing_requirements": safe_get_list(result, "missing_requirements", 5),
-            "soft_skills": safe_get_list(result, "soft_skills", 3),
-            "domain_fit": str(result.get("domain_fit", "None"))
-        }
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing failed. Raw LLM response:\n{response}")
-        return error_fallback()
+        result = llm_json(prompt, SCORE_SCHEMA, SCORE_MAX_TOKENS)
+        return normalise_score(result)
     except Exception as e:
-        print(f"Scoring error: {str(e)}\nResponse: {response[:200]}...")
+        print(f"Scoring error: {str(e)}")
         return error_fallback()
 
+def extract_job_requirements(job_desc: str) -> Optional[Dict]:
+    """Extract the rubric inputs of a job description with the LLM (None if the output is unusable)"""
+    prompt = f"""
+    Extract the hiring requirements from this job description and return ONLY JSON:
+    {job_desc}
+    
+    Required Format:
+    ```json
+    {{
+      "required_skills": ["skill1", "skill2"],
+      "bonus_skills": ["nice-to-have skill"],
+      "soft_skills": ["communication"],
+      "min_years": X,
+      "education": ["degree or field"],
+      "domain": ["industry or domain"]
+    }}
+    ```
+    
+    List each skill as a short name (e.g. "C#", "SQL Server"), not a sentence.
+    Use null for min_years if no experience duration is stated.
+    """
+    try:
+        return normalise_requirements(llm_json(prompt, "json", PARSE_MAX_TOKENS))
+    except Exception as e:
+        print(f"Requirement extraction failed: {str(e)}")
+        return None
+
+def cached_job_requirements(job_desc: str, cv_records: List[Dict]) -> Dict:
+    """
+    Job requirements, extracted once per job text and kept in the score
+    cache (so they are dropped with the job's scores when its text changes).
+    Falls back to matching the pool's skills against the description.
+    """
+    key = f"{score_cache.job_hash(job_desc)}:{make_key('requirements', LLM_MODEL, REQUIREMENTS_PROMPT_VERSION)}"
+    requirements = score_cache.get(key)
+    if requirements is None:
+        requirements = extract_job_requirements(job_desc)
+        if requirements is not None and requirements["required_skills"]:
+            score_cache.put(key, requirements)
+    if not requirements or not requirements["required_skills"]:
+        requirements = requirements_from_text(
+            job_desc,
+            [skill for cv in cv_records for skill in cv.get("technical_skills", [])],
+            [skill for cv in cv_records for skill in cv.get("soft_skills", [])],
+        )
+    return requirements
+
+def score_cache_key(cv_data: Dict, job_desc: str, tech_weight: float, soft_weight: float) -> str:
+    return score_cache.score_key(cv_data, job_desc, tech_weight, soft_weight, LLM_MODEL, SCORE_PROMPT_VERSION)
+
+def cached_score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight: float = 0.3) -> Dict:
+    """score_cv memoised on the CV record, job description, weights and model"""
+    key = score_cache_key(cv_data, job_desc, tech_weight, soft_weight)
+    scored = score_cache.get(key)
+    if scored is not None:
+        return scored
+
+    scored = score_cv(cv_data, job_desc, tech_weight, soft_weight)
+    if scored != error_fallback():  # Never cache failed scoring
+        score_cache.put(key, scored)
+    return scored
+
+# ------ Batched Scoring ------
+def score_batch_prompt(cv_records: List[Dict], job_desc: str) -> str:
+    candidates = "\n\n".join(
+        f"    Candidate c{i}:\n{candidate_summary(cv_data)}" for i, cv_data in enumerate(cv_records, 1)
+    )
+    return f"""
+    You are an expert CV-to-Job matching system. Analyze EACH of the following CVs against the job description and, for each one:
+
+{SCORING_RUBRIC}
+
+    2. List:
+       - Matched skills (required and bonus)
+       - Missing or weak requirements
+       - Any relevant soft skills or domain experience
+
+    3. Output ONLY a valid JSON array with one object per candidate:
+
+    Job Description: {job_desc}
+
+{candidates}
+
+    Output format:
+    ```json
+    [
+      {{
+        "candidate_id": "c1",
+        "relevance_score": [calculated_score_0_to_100],
+        "justification": "[concise_reason]",
+        "key_matches": ["skill1", "skill2"],
+        "missing_requirements": ["requirement1", "requirement2"],
+        "soft_skills": ["skillA", "skillB"],
+        "domain_fit": "[industry or domain match, or 'None']"
+      }}
+    ]
+    ```
+    
+    Important rules:
+    - Score every candidate independently and return exactly one object per candidate_id
+    - For key_matches, list EXACT qualifications that match the job requirements
+    - If there are no matches at all, set key_matches to ["None"]
+    - In justification, DO NOT use the candidate's name - refer to them as "the candidate"
+    - Domain fit should be a short phrase describing industry relevance
+    """
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def pack_score_batches(items: List, job_desc: str, cv_data_of=lambda item: item) -> List[List]:
+    """
+    Split items into batches whose prompt, plus room for every answer,
+    fits LLM_CONTEXT_TOKENS; longer CVs make for smaller batches.
+    """
+    budget = LLM_CONTEXT_TOKENS - estimate_tokens(score_batch_prompt([], job_desc))
+    batches, batch, used = [], [], 0
+    for item in items:
+        cost = estimate_tokens(candidate_summary(cv_data_of(item))) + SCORE_OUTPUT_TOKENS_PER_CANDIDATE
+        if batch and (len(batch) >= SCORE_BATCH_MAX_CANDIDATES or used + cost > budget):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(item)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+SCORE_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        **SCORE_SCHEMA,
+        "properties": {"candidate_id": {"type": "string"}, **SCORE_SCHEMA["properties"]},
+        "required": ["candidate_id", *SCORE_SCHEMA["required"]],
+    },
+}
+
+def valid_score_item(item: Any) -> bool:
+    if not isinstance(item, dict) or not isinstance(item.get("justification"), str):
+        return False
+    try:
+        return 0 <= int(item.get("relevance_score")) <= 100
+    except (TypeError, ValueError):
+        return False
+
+def score_cv_batch(cv_records: List[Dict], job_desc: str,
+                   tech_weight: float = 0.7, soft_weight: float = 0.3) -> List[Dict]:
+    """
+    Score several CVs with one prompt, so the job description and rubric
+    are processed once. Entries missing from the answer or failing
+    validation are retried alone with score_cv.
+    """
+    if len(cv_records) == 1:
+        return [score_cv(cv_records[0], job_desc, tech_weight, soft_weight)]
+
+    answers = {}
+    try:
+        items = llm_json(score_batch_prompt(cv_records, job_desc), SCORE_BATCH_SCHEMA,
+                         SCORE_MAX_TOKENS * len(cv_records))
+        for item in items if isinstance(items, list) else [items]:
+            if valid_score_item(item):
+                answers[str(item.get("candidate_id", "")).strip()] = item
+    except Exception as e:
+        print(f"Batch scoring failed, scoring {len(cv_records)} CVs one by one: {str(e)}")
+
+    results = []
+    for i, cv_data in enumerate(cv_records, 1):
+        item = answers.get(f"c{i}")
+        results.append(normalise_score(item) if item is not None
+                       else score_cv(cv_data, job_desc, tech_weight, soft_weight))
+    return results
+
+def cached_score_cv_batch(cv_records: List[Dict], job_desc: str,
+                          tech_weight: float = 0.7, soft_weight: float = 0.3) -> List[Dict]:
+    """score_cv_batch over the CVs without a cached score; results in input order"""
+    keys = [score_cache_key(cv_data, job_desc, tech_weight, soft_weight) for cv_data in cv_records]
+    results = [score_cache.get(key) for key in keys]
+    missing = [i for i, scored in enumerate(results) if scored is None]
+    if missing:
+        scored = score_cv_batch([cv_records[i] for i in missing], job_desc, tech_weight, soft_weight)
+        for i, result in zip(missing, scored):
+            results[i] = result
+            if result != error_fallback():  # Never cache failed scoring
+                score_cache.put(keys[i], result)
+    return results
+
 def error_fallback():
     return {
         "relevance_score": 0,
@@ -259,66 +570,464 @@ def error_fallback():
         "domain_fit": "None"
     }
 
+# ------ Ranking Pipeline ------
+def process_cv_pool(cv_paths: List[str], backend: str = EXTRACTION_BACKEND) -> List[Dict]:
+    """
+    Extract CV text in worker processes and parse with multithreading,
+    keeping only the successes. CVs whose parse and embedding are both
+    cached are not extracted at all, and paths with the same content are
+    extracted and parsed once, each getting its own copy of the result.
+    """
+    entries = [lookup_cv(path) for path in cv_paths]
+    for entry in entries:
+        if entry["status"] == "error":
+            print(f"⚠️  CV failed: {entry['path']} → {entry['message']}")
+
+    # One representative per content hash does the work for its duplicates
+    representatives: Dict[str, Dict] = {}
+    duplicates: Dict[str, Dict[str, None]] = {}
+    for entry in entries:
+        if entry["status"] == "pending":
+            representatives.setdefault(entry["content_hash"], entry)
+            duplicates.setdefault(entry["content_hash"], {})[entry["path"]] = None
+    entries = list(representatives.values())
+
+    to_extract = [e["path"] for e in entries if e["data"] is None or e["needs_embedding"]]
+    extracted = extract_texts(to_extract, backend)
+    for path, outcome in extracted.items():
+        if outcome["status"] == "error":
+            print(f"⚠️  CV failed: {path} → {outcome['message']}")
+    entries = [e for e in entries if extracted.get(e["path"], {}).get("status") != "error"]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(process_single_cv, entry, extracted.get(entry["path"], {}).get("text"))
+            for entry in entries
+        ]
+        results = [f.result() for f in concurrent.futures.as_completed(futures)]
+
+    pool = []
+    for result in results:
+        if result["status"] != "success":
+            continue
+        pool.append(result)
+        # Only the representative carries "text", so the content is embedded once
+        copy = {key: value for key, value in result.items() if key != "text"}
+        pool.extend(dict(copy, path=path) for path in duplicates[result["content_hash"]] if path != result["path"])
+    return pool
+
+async def prepare_candidates(job_req: JobRequest, embed_batch_size: int = EMBED_BATCH_SIZE) -> List[tuple]:
+    """Extract, parse and embed the pool; return (result, similarity) pairs"""
+    results = await run_in_threadpool(process_cv_pool, job_req.cv_paths)
+
+    # Embed new CVs and the job description in batches
+    job_embedding = await run_in_threadpool(
+        embed_pending_cvs, results, job_req.job_description, embed_batch_size
+    )
+
+    # One matrix-vector product against the stored, pre-normalised CV embeddings
+    similarities = embedding_store.similarities(job_embedding, [r["content_hash"] for r in results])
+    return list(zip(results, similarities.tolist()))
+
+def prefilter_candidates(prepared: List[tuple], prefilter_k: Optional[int]) -> tuple:
+    """
+    Keep the `prefilter_k` candidates most similar to the job for LLM
+    scoring; return (kept, skipped) where skipped lists the rest.
+    """
+    if prefilter_k is None or len(prepared) <= prefilter_k:
+        return prepared, []
+    ordered = sorted(prepared, key=lambda pair: pair[1], reverse=True)
+    skipped = [
+        {"status": "skipped", "applicant": result["data"].get("name", "Unknown"),
+         "similarity": similarity, "cv_path": result["path"]}
+        for result, similarity in ordered[prefilter_k:]
+    ]
+    return ordered[:prefilter_k], skipped
+
+def build_candidate(result: Dict, similarity: float, scored: Dict) -> Dict:
+    return {
+        "status": "scored",
+        "applicant": result["data"].get("name", "Unknown"),
+        "similarity": similarity,
+        "relevance_score": scored["relevance_score"],
+        "combined_score": (similarity * 0.4) + (scored["relevance_score"]/100 * 0.6),
+        **scored,
+        # Scored from a fallback parse or score; neither is cached, so a later ranking retries it
+        "analysis_failed": result["data"] == parse_fallback() or scored == error_fallback(),
+        "cv_path": result["path"],  # << Add this line (bulletproof ID)
+    }
+
+def build_unscored_candidate(result: Dict, similarity: float) -> Dict:
+    return {
+        "status": "unscored",
+        "applicant": result["data"].get("name", "Unknown"),
+        "similarity": similarity,
+        "relevance_score": None,
+        "combined_score": None,
+        "cv_path": result["path"],
+    }
+
+async def score_candidates(prepared: List[tuple], job_desc: str,
+                           max_in_flight: int = SCORING_CONCURRENCY,
+                           deadline: Optional[float] = None,
+                           tech_weight: float = 0.7, soft_weight: float = 0.3,
+                           batch_scoring: bool = False):
+    """
+    Yield each candidate as soon as its LLM score is available.
+
+    At most `max_in_flight` of this ranking's LLM calls run at once, within
+    the process-wide llm_slots limit. With `batch_scoring`,
+    each call scores a batch of CVs sized to the context window. If the
+    event-loop time `deadline` passes, the remaining candidates are
+    yielded unscored.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def score_group(group: List[tuple]) -> List[Dict]:
+        async with semaphore:
+            if len(group) == 1:
+                result = group[0][0]
+                scored = [await run_in_threadpool(cached_score_cv, result["data"], job_desc,
+                                                  tech_weight, soft_weight)]
+            else:
+                scored = await run_in_threadpool(cached_score_cv_batch, [r["data"] for r, _ in group],
+                                                 job_desc, tech_weight, soft_weight)
+        return [build_candidate(r, s, sc) for (r, s), sc in zip(group, scored)]
+
+    if batch_scoring:
+        groups = pack_score_batches(prepared, job_desc, lambda pair: pair[0]["data"])
+    else:
+        groups = [[pair] for pair in prepared]
+
+    loop = asyncio.get_running_loop()
+    tasks = {asyncio.ensure_future(score_group(group)): group for group in groups}
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for candidate in task.result():
+                    yield candidate
+            if deadline is not None and loop.time() >= deadline:
+                break
+        for task in pending:
+            for result, similarity in tasks[task]:
+                yield build_unscored_candidate(result, similarity)
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def score_candidates_rubric(prepared: List[tuple], job_desc: str,
+                                  llm_top_k: Optional[int] = None,
+                                  max_in_flight: int = SCORING_CONCURRENCY,
+                                  deadline: Optional[float] = None,
+                                  tech_weight: float = 0.7, soft_weight: float = 0.3) -> List[Dict]:
+    """
+    Score the whole pool with the local rubric in one vectorised pass, then
+    have the LLM write justifications for the best `llm_top_k` only.
+    """
+    records = [result["data"] for result, _ in prepared]
+    requirements = await run_in_threadpool(cached_job_requirements, job_desc, records)
+    scores = await run_in_threadpool(rubric_scorer.score_candidates, records, requirements)
+    candidates = [build_candidate(result, similarity, scored)
+                  for (result, similarity), scored in zip(prepared, scores)]
+    if not llm_top_k:
+        return candidates
+
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def justify(candidate: Dict, cv_data: Dict):
+        async with semaphore:
+            scored = await run_in_threadpool(cached_score_cv, cv_data, job_desc, tech_weight, soft_weight)
+        if scored != error_fallback():
+            candidate["justification"] = scored["justification"]
+
+    order = sorted(range(len(candidates)), key=lambda i: candidates[i]["combined_score"], reverse=True)
+    tasks = [asyncio.ensure_future(justify(candidates[i], records[i])) for i in order[:llm_top_k]]
+    timeout = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:  # Past the deadline these keep the rubric's own justification
+        task.cancel()
+    return candidates
+
+def rank(candidates: List[Dict], top_n: int) -> List[Dict]:
+    scored = [c for c in candidates if c["status"] == "scored"]
+    return sorted(scored, key=lambda x: x["combined_score"], reverse=True)[:top_n]
+
+def unscored(candidates: List[Dict]) -> List[Dict]:
+    return [c for c in candidates if c["status"] == "unscored"]
+
+def format_event(event: str, data: Dict, stream_format: str) -> str:
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+async def ranking_events(job_req: JobRequest, options: RankingOptions):
+    """
+    Run one ranking, yielding ("prepared", counts), one ("candidate", ...)
+    per CV as it is scored, and finally ("summary", ranked results).
+    """
+    if job_req.job_id is not None:
+        await run_in_threadpool(score_cache.track_job, job_req.job_id, job_req.job_description)
+
+    deadline = None
+    if options.deadline_seconds is not None:
+        deadline = asyncio.get_running_loop().time() + options.deadline_seconds
+
+    prepared = await prepare_candidates(job_req, options.embed_batch_size)
+    prepared, skipped = prefilter_candidates(prepared, options.prefilter_k)
+    yield "prepared", {"total": len(prepared), "skipped": len(skipped)}
+
+    candidates = []
+    if options.scorer == "rubric":
+        candidates = await score_candidates_rubric(prepared, job_req.job_description, options.llm_top_k,
+                                                   options.max_in_flight, deadline,
+                                                   options.tech_weight, options.soft_weight)
+        for candidate in candidates:
+            yield "candidate", candidate
+    else:
+        async for candidate in score_candidates(prepared, job_req.job_description, options.max_in_flight,
+                                                deadline, options.tech_weight, options.soft_weight,
+                                                options.batch_scoring):
+            candidates.append(candidate)
+            yield "candidate", candidate
+
+    yield "summary", {
+        "job_id": job_req.job_id,
+        "results": rank(candidates, options.top_n),
+        "unscored": unscored(candidates),
+        "skipped": skipped,
+    }
+
+async def run_ranking(job_req: JobRequest, options: RankingOptions, on_progress=None) -> Dict:
+    """Run one ranking to completion; on_progress(done, total) is awaited as candidates finish"""
+    done = 0
+    async for event, data in ranking_events(job_req, options):
+        if event == "prepared" and on_progress is not None:
+            await on_progress(0, data["total"])
+        elif event == "candidate" and on_progress is not None:
+            done += 1
+            await on_progress(done, None)
+        elif event == "summary":
+            return data
+
+async def stream_ranking(job_req: JobRequest, options: RankingOptions, stream_format: str):
+    """Emit one "candidate" event per scored CV, then a final ranked "summary" event"""
+    try:
+        async for event, data in ranking_events(job_req, options):
+            if event != "prepared":
+                yield format_event(event, data, stream_format)
+    except Exception as e:
+        yield format_event("error", {"detail": str(e)}, stream_format)
+
+# ------ Background Ranking Jobs ------
+ranking_jobs_available = asyncio.Event()
+
+async def process_ranking_job(job: Dict) -> None:
+    job_id = job["id"]
+
+    async def on_progress(done: int, total: Optional[int]):
+        await run_in_threadpool(ranking_jobs.set_progress, job_id, done, total)
+
+    try:
+        result = await run_ranking(JobRequest(**job["request"]), RankingOptions(**job["options"]), on_progress)
+        await run_in_threadpool(ranking_jobs.complete, job_id, result)
+    except Exception as e:
+        print(f"⚠️  Ranking job failed: {job_id} → {e}")
+        await run_in_threadpool(ranking_jobs.fail, job_id, str(e))
+
+async def ranking_worker():
+    """Claim and run queued ranking jobs until the service stops"""
+    while True:
+        ranking_jobs_available.clear()
+        job = await run_in_threadpool(ranking_jobs.claim)
+        if job is None:
+            try:
+                await asyncio.wait_for(ranking_jobs_available.wait(), timeout=RANKING_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process_ranking_job(job)
+
+@app.on_event("startup")
+async def warm_up_resources():
+    if WARM_UP_ON_STARTUP:
+        await run_in_threadpool(warm_up, embedder, llm, embedding_store)
+
+@app.on_event("startup")
+async def start_ranking_workers():
+    requeued = ranking_jobs.requeue_running()
+    if requeued:
+        print(f"Re-queued {requeued} interrupted ranking jobs")
+    for _ in range(RANKING_WORKERS):
+        asyncio.create_task(ranking_worker())
+
 # ------ API Endpoints ------
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
 @app.post("/match-candidates")
 async def match_candidates(
     job_req: JobRequest,
-    tech_weight: float = 0.7,
-    soft_weight: float = 0.3,
-    top_n: int = 5
+    options: RankingOptions = Depends(),
+    stream: bool = False,
+    stream_format: str = "ndjson"
 ):
-    """Main API endpoint for candidate matching"""
-    try:
-        # Process CVs with multithreading
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(process_single_cv, path) for path in job_req.cv_paths]
-            results = [f.result() for f in concurrent.futures.as_completed(futures)]
+    """
+    Main API endpoint for candidate matching.
 
-        # Generate job embedding on GPU
-        with torch.no_grad():
-            job_embedding = embedder.encode(job_req.job_description, device=DEVICE, convert_to_tensor=True).cpu().numpy()
+    With stream=true the response is NDJSON (or Server-Sent Events with
+    stream_format=sse) carrying each candidate as soon as it is scored,
+    followed by the ranked summary.
 
-        
-        # Calculate similarities and scores
-        candidates = []
-        for result in results:
-            if result["status"] != "success":
-                continue
-                
-            cv_data = result["data"]
-            similarity = cosine_similarity(job_embedding, cv_data.get("embedding", []))
-            scored = await run_in_threadpool(score_cv, cv_data, job_req.job_description)
-            
-            candidates.append({
-                "applicant": cv_data.get("name", "Unknown"),
-                "similarity": similarity,
-                "relevance_score": scored["relevance_score"],
-                "combined_score": (similarity * 0.4) + (scored["relevance_score"]/100 * 0.6),
-                **scored,
-                "cv_path": result["path"],  # << Add this line (bulletproof ID)
-            })
+    LLM scoring runs up to max_in_flight calls concurrently. When
+    deadline_seconds is set and expires, the candidates scored so far are
+    ranked and the rest are listed under "unscored".
+
+    With prefilter_k set, only the prefilter_k CVs most similar to the job
+    (by embedding) are sent to the LLM; the others are listed under
+    "skipped".
+    """
+    if stream:
+        if stream_format not in STREAM_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown stream_format '{stream_format}'")
+        return StreamingResponse(
+            stream_ranking(job_req, options, stream_format),
+            media_type=STREAM_MEDIA_TYPES[stream_format],
+        )
 
+    try:
         # Sort and return results
-        sorted_candidates = sorted(candidates, key=lambda x: x["combined_score"], reverse=True)[:top_n]
-        return {"results": sorted_candidates}
+        return await run_ranking(job_req, options)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ranking-jobs", status_code=202)
+async def submit_ranking_job(job_req: JobRequest, options: RankingOptions = Depends()):
+    """Queue a ranking and return its id immediately; poll /ranking-jobs/{id} for progress"""
+    ranking_id = await run_in_threadpool(ranking_jobs.submit, job_req.dict(), options.dict())
+    ranking_jobs_available.set()
+    return {"id": ranking_id, "status": "queued", "status_url": f"/ranking-jobs/{ranking_id}"}
+
+@app.get("/ranking-jobs/{ranking_id}")
+async def get_ranking_job(ranking_id: str):
+    """Status and progress of a queued ranking"""
+    job = await run_in_threadpool(ranking_jobs.get, ranking_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ranking job")
+    return job
+
+@app.get("/ranking-jobs/{ranking_id}/result")
+async def get_ranking_job_result(ranking_id: str):
+    """Final ranking of a finished job, in the same shape as /match-candidates"""
+    job = await run_in_threadpool(ranking_jobs.get, ranking_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ranking job")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Ranking job is {job['status']}")
+    return job["result"]
+
+@app.get("/health")
+async def health():
+    """Which heavy resources are loaded and how long each took"""
+    return {"status": "ok", "resources": resource_status()}
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Hit/miss counters for the persistent caches"""
+    return {
+        "parse_cache": parse_cache.stats(),
+        "score_cache": score_cache.stats(),
+        "embedding_store": {"entries": len(embedding_store), "capacity": embedding_store.capacity},
+    }
+
+@app.post("/preprocess-cvs")
+async def preprocess_cvs(req: PreprocessRequest):
+    """
+    Extract, parse and embed CVs ahead of any ranking, filling the parse
+    cache and embedding store so a later ranking only has to score them.
+    Reports "ready" or "failed" per path; failed CVs can be retried.
+    """
+    results = await run_in_threadpool(process_cv_pool, req.cv_paths)
+    await run_in_threadpool(embed_pending_cvs, results)
+    processed = {r["path"]: r for r in results}
+
+    outcomes = []
+    for path in req.cv_paths:
+        result = processed.get(path)
+        if result is None:
+            outcomes.append({"cv_path": path, "status": "failed", "message": "Text extraction failed"})
+        elif result["data"] == parse_fallback():  # Not cached, so a retry parses again
+            outcomes.append({"cv_path": path, "status": "failed", "message": "CV parse failed"})
+        else:
+            outcomes.append({"cv_path": path, "status": "ready", "content_hash": result["content_hash"]})
+    return {"results": outcomes}
+
+# ------ Upload Storage ------
+async def store_upload(file: UploadFile) -> tuple:
+    """
+    Stream an upload to disk in chunks while hashing it, and keep it as
+    uploaded_cvs/objects/<sha256>.pdf. Returns (object_path, content_hash,
+    deduplicated); a file whose hash is already stored is not kept twice.
+    """
+    objects_dir = os.path.join(UPLOAD_DIR, "objects")
+    os.makedirs(objects_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=objects_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        content_hash = digest.hexdigest()
+        object_path = os.path.join(objects_dir, f"{content_hash}.pdf")
+        deduplicated = os.path.exists(object_path)
+        if deduplicated:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, object_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return object_path, content_hash, deduplicated
+
+def link_upload(object_path: str, file_path: str) -> None:
+    """Expose a stored object under a job folder without copying its bytes"""
+    if os.path.exists(file_path):
+        if os.path.samefile(object_path, file_path):
+            return
+        os.remove(file_path)
+    try:
+        os.link(object_path, file_path)
+    except OSError:
+        shutil.copyfile(object_path, file_path)  # Filesystems without hard links
+
 @app.post("/upload-cvs")
 async def upload_cvs(
     job_id: str = Form(...),  # Get job_id from form data
     files: List[UploadFile] = File(...)
 ):
-    """Upload CVs to a job-specific folder"""
+    """
+    Upload CVs to a job-specific folder.
+
+    Files are stored content-addressed; the job folder holds hard links
+    under the original filenames, so re-uploading an unchanged CV writes
+    nothing new. Each entry in "files" carries the content hash.
+    """
     try:
-        base_dir = "uploaded_cvs"
-        job_dir = os.path.join(base_dir, job_id)
+        job_dir = os.path.join(UPLOAD_DIR, job_id)
         
         # Create directory if not exists
         os.makedirs(job_dir, exist_ok=True)
         
         saved_paths = []
+        saved_files = []
         
         for file in files:
             # Sanitize filename
@@ -326,14 +1035,21 @@ async def upload_cvs(
             file_path = os.path.join(job_dir, filename)
             
             # Save file
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
+            object_path, content_hash, deduplicated = await store_upload(file)
+            link_upload(object_path, file_path)
             
             saved_paths.append(file_path)
+            saved_files.append({
+                "filename": filename,
+                "path": file_path,
+                "content_hash": content_hash,
+                "deduplicated": deduplicated,
+            })
         
         return {
             "job_id": job_id,
             "cv_paths": saved_paths,
+            "files": saved_files,
             "message": f"CVs uploaded successfully to {job_dir}"
         }
     except Exception as e:
@@ -0,0 +1,318 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, append_key_log, read_key_log
+
+# ------ Configuration ------
+QUANTIZATION_MODES = ("int8", "binary")
+# The first pass keeps k * factor candidates for exact re-scoring; sign bits
+# discard more information, so binary codes need a longer shortlist
+RESCORE_FACTORS = {"int8": 4, "binary": 10}
+SCAN_CHUNK_ROWS = 65536  # Rows scored per step, bounds temporary memory during a scan
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _normalise(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class QuantizedIndex:
+    """
+    Compact in-memory index with exact re-scoring.
+
+    Only the quantized codes are held in RAM: int8 codes with one float
+    scale per vector (4x smaller than float32) or sign bits (32x smaller).
+    A search scores every code, keeps the best k * rescore_factor keys and
+    re-ranks those by exact cosine similarity against full-precision
+    vectors read from a memory-mapped EmbeddingStore on disk.
+
+    It replaces Chroma's vector index rather than sitting next to it: with
+    a quantized VECTOR_INDEX_MODE the CV collection stores documents and
+    metadata under a placeholder vector, so this memory-mapped store is
+    the only full-precision copy and is paged in for re-scoring alone.
+
+    Writes are appends: new codes go to the end of the code files and their
+    keys to a log, changed codes are overwritten in place and removals are
+    logged as tombstones. The files are rewritten only once dead rows
+    outnumber live ones.
+    """
+
+    def __init__(self, directory: str, dim: int, mode: str = "int8",
+                 rescore_factor: Optional[int] = None):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+        self.directory = directory
+        self.dim = dim
+        self.mode = mode
+        self.rescore_factor = rescore_factor or RESCORE_FACTORS[mode]
+        self.full = EmbeddingStore(os.path.join(directory, "full"), dim)
+        self._lock = threading.Lock()
+
+        self._codes_path = os.path.join(directory, f"codes.{mode}.bin")
+        self._scales_path = os.path.join(directory, f"scales.{mode}.bin")
+        self._keys_path = os.path.join(directory, f"keys.{mode}.log")
+        self.keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._code_buffer = np.empty((0, self._code_width()), dtype=self._code_dtype())
+        self._scale_buffer = np.empty(0, dtype=np.float32)
+        self._disk_rows: Dict[str, int] = {}  # Row of each live key in the code files
+        self._disk_count = 0  # Rows in the code files, live or dead
+        self._load()
+
+    # ------ Quantization ------
+    def _code_width(self) -> int:
+        return self.dim if self.mode == "int8" else (self.dim + 7) // 8
+
+    def _code_dtype(self):
+        return np.int8 if self.mode == "int8" else np.uint8
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1), np.empty(0, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Score codes against a normalised query; higher is closer"""
+        codes = self._codes if rows is None else self._codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(codes), SCAN_CHUNK_ROWS):
+                chunk = np.bitwise_xor(codes[start:start + SCAN_CHUNK_ROWS], query_bits)
+                scores[start:start + len(chunk)] = -_POPCOUNT[chunk].sum(axis=1, dtype=np.int32)
+            return scores
+        scales = self._scales if rows is None else self._scales[rows]
+        for start in range(0, len(codes), SCAN_CHUNK_ROWS):
+            chunk = codes[start:start + SCAN_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + len(chunk)] = (chunk @ query) * scales[start:start + len(chunk)]
+        return scores
+
+    # ------ Storage ------
+    @property
+    def _codes(self) -> np.ndarray:
+        return self._code_buffer[:len(self.keys)]
+
+    @property
+    def _scales(self) -> np.ndarray:
+        return self._scale_buffer[:len(self.keys)]
+
+    def _reserve(self, extra: int) -> None:
+        """Grow the code buffers (doubling) so `extra` more rows fit without copying on every add"""
+        needed = len(self.keys) + extra
+        capacity = len(self._code_buffer)
+        if needed <= capacity:
+            return
+        capacity = max(capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        codes = np.empty((capacity, self._code_width()), dtype=self._code_dtype())
+        codes[:len(self.keys)] = self._codes
+        self._code_buffer = codes
+        if self.mode == "int8":
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:len(self.keys)] = self._scales
+            self._scale_buffer = scales
+
+    def _load(self) -> None:
+        disk_rows: Dict[str, int] = {}
+        count = 0
+        for line in read_key_log(self._keys_path):
+            if line.startswith("+"):
+                disk_rows[line[1:]] = count
+                count += 1
+            else:
+                disk_rows.pop(line[1:], None)
+        if not count:
+            return
+        # Rows written after the last logged key belong to an interrupted add
+        codes = np.fromfile(self._codes_path, dtype=self._code_dtype(),
+                            count=count * self._code_width()).reshape(count, self._code_width())
+        self.keys = sorted(disk_rows, key=disk_rows.get)
+        live = np.fromiter((disk_rows[key] for key in self.keys), dtype=np.int64, count=len(self.keys))
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        self._code_buffer = codes[live]
+        if self.mode == "int8":
+            self._scale_buffer = np.fromfile(self._scales_path, dtype=np.float32, count=count)[live]
+        self._disk_rows, self._disk_count = disk_rows, count
+        self._truncate()
+
+    def _truncate(self) -> None:
+        """Cut the code files back to the logged rows, so appends line up with the log"""
+        files = [(self._codes_path, self._code_width() * self._code_buffer.itemsize)]
+        if self.mode == "int8":
+            files.append((self._scales_path, self._scale_buffer.itemsize))
+        for path, row_bytes in files:
+            with open(path, "ab") as f:
+                if f.tell() > self._disk_count * row_bytes:
+                    f.truncate(self._disk_count * row_bytes)
+
+    def _append(self, keys: List[str], codes: np.ndarray, scales: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._disk_count:
+            self._truncate()
+        with open(self._codes_path, "ab") as f:
+            f.write(codes.tobytes())
+        if self.mode == "int8":
+            with open(self._scales_path, "ab") as f:
+                f.write(scales.tobytes())
+        for key in keys:
+            self._disk_rows[key] = self._disk_count
+            self._disk_count += 1
+        # Keys are logged only once their codes are on disk
+        append_key_log(self._keys_path, ["+" + key for key in keys])
+
+    def _overwrite(self, keys: List[str]) -> None:
+        """Write the current codes of existing keys over their rows in the code files"""
+        files = [(self._codes_path, self._codes)]
+        if self.mode == "int8":
+            files.append((self._scales_path, self._scales))
+        for path, array in files:
+            row_bytes = array[0].nbytes if array.ndim > 1 else array.itemsize
+            with open(path, "r+b") as f:
+                for key in keys:
+                    f.seek(self._disk_rows[key] * row_bytes)
+                    f.write(array[self._positions[key]].tobytes())
+
+    def _compact(self) -> None:
+        """Rewrite the files with only the live rows"""
+        os.makedirs(self.directory, exist_ok=True)
+        files = [(self._codes_path, self._codes.tobytes())]
+        if self.mode == "int8":
+            files.append((self._scales_path, self._scales.tobytes()))
+        files.append((self._keys_path, "".join("+" + key + "\n" for key in self.keys).encode()))
+        for path, data in files:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+        for path, _ in files:
+            os.replace(path + ".tmp", path)
+        self._disk_rows = dict(self._positions)
+        self._disk_count = len(self.keys)
+
+    # ------ Public API ------
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, keys: List[str], vectors) -> None:
+        """Quantize and store vectors, overwriting the codes of known keys"""
+        vectors = _normalise(np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim))
+        self.full.put_many(keys, vectors)
+        codes, scales = self._quantize(vectors)
+        latest = {key: i for i, key in enumerate(keys)}  # A repeated key keeps its last vector
+        with self._lock:
+            new_keys = [key for key in latest if key not in self._positions]
+            known_keys = [key for key in latest if key in self._positions]
+            for key in known_keys:
+                self._code_buffer[self._positions[key]] = codes[latest[key]]
+                if self.mode == "int8":
+                    self._scale_buffer[self._positions[key]] = scales[latest[key]]
+            if known_keys:
+                self._overwrite(known_keys)
+            if new_keys:
+                rows = [latest[key] for key in new_keys]
+                self._reserve(len(new_keys))
+                start = len(self.keys)
+                self._code_buffer[start:start + len(rows)] = codes[rows]
+                if self.mode == "int8":
+                    self._scale_buffer[start:start + len(rows)] = scales[rows]
+                for key in new_keys:
+                    self._positions[key] = len(self.keys)
+                    self.keys.append(key)
+                self._append(new_keys, codes[rows], scales[rows] if self.mode == "int8" else scales)
+
+    def remove(self, keys: List[str]) -> None:
+        """Drop keys from the search (their full-precision rows stay on disk unused)"""
+        with self._lock:
+            drop = [key for key in dict.fromkeys(keys) if key in self._positions]
+            if not drop:
+                return
+            keep = np.setdiff1d(np.arange(len(self.keys)), [self._positions[key] for key in drop])
+            self._code_buffer = self._codes[keep]
+            if self.mode == "int8":
+                self._scale_buffer = self._scales[keep]
+            self.keys = [self.keys[i] for i in keep]
+            self._positions = {key: i for i, key in enumerate(self.keys)}
+            if self._disk_count - len(self.keys) > len(self.keys):
+                self._compact()
+            else:
+                for key in drop:
+                    del self._disk_rows[key]
+                append_key_log(self._keys_path, ["-" + key for key in drop])
+
+    def search(self, query: Sequence[float], k: int,
+               candidates: Optional[List[str]] = None,
+               rescore_factor: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Top `k` (key, cosine similarity) pairs, best first. `candidates`
+        restricts the search to those keys (e.g. a metadata pre-filter).
+        """
+        query = _normalise(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        with self._lock:
+            if candidates is None:
+                rows, keys = None, list(self.keys)
+            else:
+                keys = [key for key in candidates if key in self._positions]
+                rows = np.fromiter((self._positions[key] for key in keys), dtype=np.int64, count=len(keys))
+            if not keys:
+                return []
+            scores = self._approximate_scores(query, rows)
+
+        shortlist_size = min(len(keys), k * (rescore_factor or self.rescore_factor))
+        shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+        shortlist_keys = [keys[i] for i in shortlist]
+        exact = self.full.similarities(query, shortlist_keys)
+        order = np.argsort(-exact)[:k]
+        return [(shortlist_keys[i], float(exact[i])) for i in order]
+
+    def exact_search(self, query: Sequence[float], k: int,
+                     candidates: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Full-precision brute-force search, the reference for recall_at_k"""
+        keys = [key for key in (self.keys if candidates is None else candidates) if key in self._positions]
+        if not keys:
+            return []
+        exact = self.full.similarities(query, keys)
+        order = np.argsort(-exact)[:k]
+        return [(keys[i], float(exact[i])) for i in order]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """RAM held by the codes versus the same vectors as float32"""
+        return {
+            "quantized": int(self._codes.nbytes + self._scales.nbytes),
+            "float32": len(self.keys) * self.dim * np.dtype(np.float32).itemsize,
+        }
+
+    def recall_at_k(self, queries, k: int = 10,
+                    rescore_factor: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Mean overlap between the quantized and exact top-k over `queries`,
+        plus the size of the codes against float32, to judge a mode before
+        switching to it.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        recalls = []
+        for query in queries:
+            exact = {key for key, _ in self.exact_search(query, k)}
+            if not exact:
+                continue
+            approximate = {key for key, _ in self.search(query, k, rescore_factor=rescore_factor)}
+            recalls.append(len(exact & approximate) / len(exact))
+        memory = self.memory_bytes()
+        return {
+            "mode": self.mode,
+            "k": k,
+            "queries": len(recalls),
+            "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+            "compression": round(memory["float32"] / memory["quantized"], 1) if memory["quantized"] else None,
+            **memory,
+        }
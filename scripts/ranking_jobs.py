@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+# ------ Configuration ------
+JOBS_DB_PATH = os.environ.get("RANKING_JOBS_DB", "ranking_jobs.db")
+
+
+class RankingJobQueue:
+    """
+    Durable queue of ranking jobs in a local SQLite table.
+
+    Jobs move queued -> running -> done | failed. Jobs left "running" by
+    a crashed or restarted service are put back in the queue on startup.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ranking_jobs (
+                   id TEXT PRIMARY KEY,
+                   status TEXT NOT NULL,
+                   request TEXT NOT NULL,
+                   options TEXT NOT NULL,
+                   progress_done INTEGER NOT NULL DEFAULT 0,
+                   progress_total INTEGER,
+                   result TEXT,
+                   error TEXT,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ranking_jobs_status ON ranking_jobs(status, created_at)"
+        )
+        self._conn.commit()
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ranking_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def submit(self, request: Dict, options: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO ranking_jobs (id, status, request, options, created_at, updated_at)
+                   VALUES (?, 'queued', ?, ?, ?, ?)""",
+                (job_id, json.dumps(request), json.dumps(options), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running and return it"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ranking_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ranking_jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            self._conn.commit()
+        return {
+            "id": row["id"],
+            "request": json.loads(row["request"]),
+            "options": json.loads(row["options"]),
+        }
+
+    def requeue_running(self) -> int:
+        """Return jobs interrupted by a restart to the queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                """UPDATE ranking_jobs SET status = 'queued', progress_done = 0, updated_at = ?
+                   WHERE status = 'running'""",
+                (time.time(),),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def set_progress(self, job_id: str, done: int, total: Optional[int] = None) -> None:
+        if total is None:
+            self._update(job_id, progress_done=done)
+        else:
+            self._update(job_id, progress_done=done, progress_total=total)
+
+    def complete(self, job_id: str, result: Dict) -> None:
+        self._update(job_id, status="done", result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._update(job_id, status="failed", error=error)
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ranking_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "status": row["status"],
+            "progress": {"done": row["progress_done"], "total": row["progress_total"]},
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if include_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
@@ -1,22 +1,36 @@
-import pdfplumber
 import os
+import sys
 import glob
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from langchain_community.llms import Ollama
-from sentence_transformers import SentenceTransformer
-import chromadb
+from typing import List, Dict, Any, Optional
 import json
 import hashlib
-from chromadb.utils.embedding_functions import EmbeddingFunction
+import queue
+import threading
+import time
+import numpy as np
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from cv_cache import LRUCache, file_sha256, make_key
+from ingest_manifest import IngestManifest
+from lazy_resources import LazyResource, warm_up
+from llm_client import CV_SCHEMA, SCORE_SCHEMA, generate_json, repair_json
+from pdf_text import EXTRACTION_BACKEND, EXTRACTION_WORKERS, extract_text, extract_texts
+from quantized_index import QuantizedIndex
 
 # 1. Define custom embedding function for mxbai
-class MXBAIEmbeddingFunction(EmbeddingFunction):
-    def __init__(self):
-        self.model = SentenceTransformer("mixedbread-ai/mxbai-embed-large-v1")
+def load_embedding_function():
+    """Build the mxbai embedding function (chromadb and the model are imported on first use)"""
+    from chromadb.utils.embedding_functions import EmbeddingFunction
+    from sentence_transformers import SentenceTransformer
     
-    def __call__(self, input: List[str]) -> List[List[float]]:
-        return self.model.encode(input).tolist()
+    class MXBAIEmbeddingFunction(EmbeddingFunction):
+        def __init__(self):
+            self.model = SentenceTransformer(EMBEDDING_MODEL)
+        
+        def __call__(self, input: List[str]) -> List[List[float]]:
+            return self.model.encode(input).tolist()
+    
+    return MXBAIEmbeddingFunction()
 
 # 2. Define structured CV format
 class CVExperience(BaseModel):
@@ -32,43 +46,140 @@ class CVData(BaseModel):
     experience: List[CVExperience]
     education: str
 
-# 3. Initialize components
-llm = Ollama(model="deepseek-r1:14b", temperature=0)
-chroma_client = chromadb.PersistentClient(path="cv_db")
+# Model and prompt versions; recorded in the ingest manifest so a change triggers re-processing
+LLM_MODEL = "deepseek-r1:14b"
+EMBEDDING_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
+PARSE_PROMPT_VERSION = "1"
 
-# Global ChromaDB collection
-cv_collection = None
+# Structured output: Ollama constrains generation to the JSON schema, caps
+# generated tokens and switches off deepseek-r1's reasoning text
+STRUCTURED_OUTPUT = False
+PARSE_MAX_TOKENS = 1024
+SCORE_MAX_TOKENS = 512
 
-def initialize_chroma_collection():
-    """Initialize the ChromaDB collection with custom embeddings"""
-    global cv_collection
+# Bulk ingestion settings
+INGEST_PARSE_WORKERS = 4  # Concurrent parse_cv calls
+INGEST_EMBED_BATCH_SIZE = 64  # Documents per encoder call
+INGEST_UPSERT_BATCH_SIZE = 256  # Documents per Chroma upsert
+INGEST_QUEUE_SIZE = 512  # Bound on items waiting between two stages
+
+# Metadata layout: list fields are "|"-joined and every skill also gets a
+# boolean "skill:<name>" key so Chroma can filter on it inside the search
+SKILL_KEY_PREFIX = "skill:"
+LIST_SEPARATOR = "|"
+EDUCATION_LEVELS = [  # Checked in order; the first match wins
+    (4, ("phd", "ph.d", "doctor")),
+    (3, ("master", "msc", "m.sc", "mba", "meng", "m.eng")),
+    (2, ("bachelor", "bsc", "b.sc", "beng", "b.eng", "licence", "undergraduate")),
+    (1, ("associate", "diploma", "certificate", "hnd")),
+]
+
+# Vector search: "exact" searches Chroma's own index; "int8" or "binary" run
+# the first pass over compact codes and re-score the shortlist exactly.
+# In those modes Chroma keeps only documents and metadata (under a
+# one-dimensional placeholder vector), and the full-precision vectors live
+# memory-mapped on disk, so RAM holds the codes alone. After switching an
+# existing exact-mode database, run build_quantized_index() once
+VECTOR_INDEX_MODE = "exact"
+QUANTIZED_INDEX_DIR = os.path.join("cv_db", "quantized")
+CV_COLLECTION_NAME = "cv_collection"
+METADATA_COLLECTION_NAME = "cv_collection_metadata"  # Quantized modes
+PLACEHOLDER_EMBEDDING = [0.0]
+
+# Query embeddings kept in memory; one job description is typically searched
+# by several functions back-to-back
+QUERY_CACHE_MAX_ENTRIES = 512
+
+# Hybrid retrieval: BM25 keyword ranking fused with the dense ranking
+HYBRID_SPARSE_WEIGHT = 1.0  # Weight of the BM25 ranking in reciprocal rank fusion (dense is 1.0)
+
+# 3. Initialize components (each loads once, on first use, behind a lock)
+def load_llm():
+    from langchain_community.llms import Ollama
     
-    # Create embedding function
-    embedding_func = MXBAIEmbeddingFunction()
+    return Ollama(model=LLM_MODEL, temperature=0)
+
+def load_chroma_client():
+    import chromadb
     
+    return chromadb.PersistentClient(path="cv_db")
+
+def open_chroma_collection(name: str, embedding_function=None):
+    """Get a ChromaDB collection, creating it if needed"""
     # Try to get or create collection
     try:
         # First try to get existing collection
-        cv_collection = chroma_client.get_collection(
-            name="cv_collection",
-            embedding_function=embedding_func
+        collection = chroma_client.get_collection(
+            name=name,
+            embedding_function=embedding_function
         )
-        print("Found existing CV collection in database.")
+        print(f"Found existing collection {name} in database.")
     except Exception as e:
         # If that fails for any reason, create a new collection
-        print(f"Creating new CV collection: {str(e)}")
-        cv_collection = chroma_client.create_collection(
-            name="cv_collection",
-            embedding_function=embedding_func
+        print(f"Creating new collection {name}: {str(e)}")
+        collection = chroma_client.create_collection(
+            name=name,
+            embedding_function=embedding_function
         )
-        print("Created new CV collection in database.")
+        print(f"Created new collection {name} in database.")
     
-    return cv_collection
+    return collection
+
+def initialize_float_collection():
+    """The collection holding full embeddings in Chroma's own index (exact mode)"""
+    return open_chroma_collection(CV_COLLECTION_NAME, embedding_func.load())
+
+def initialize_chroma_collection():
+    """
+    The CV collection: full embeddings in exact mode; in the quantized modes
+    documents and metadata only, the vectors being kept by quantized_index
+    """
+    if use_quantized_index():
+        return open_chroma_collection(METADATA_COLLECTION_NAME)
+    return float_collection.load()
+
+llm = LazyResource("llm", load_llm)
+chroma_client = LazyResource("chroma_client", load_chroma_client)
+embedding_func = LazyResource("embedding_function", load_embedding_function)
+float_collection = LazyResource("float_collection", initialize_float_collection)
+cv_collection = LazyResource("cv_collection", initialize_chroma_collection)
+
+def load_quantized_index(mode: Optional[str] = None) -> QuantizedIndex:
+    dim = embedding_func.model.get_sentence_embedding_dimension()
+    return QuantizedIndex(QUANTIZED_INDEX_DIR, dim, mode or VECTOR_INDEX_MODE)
+
+quantized_index = LazyResource("quantized_index", load_quantized_index)
+bm25_index = LazyResource("bm25_index", BM25Index)
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+def use_quantized_index() -> bool:
+    return VECTOR_INDEX_MODE != "exact"
+
+def collection_embeddings(embeddings) -> List[List[float]]:
+    """Vectors to upsert into cv_collection: the embeddings, or placeholders in the quantized modes"""
+    if use_quantized_index():
+        return [list(PLACEHOLDER_EMBEDDING) for _ in embeddings]
+    return [list(map(float, embedding)) for embedding in embeddings]
+
+query_embedding_cache = LRUCache(QUERY_CACHE_MAX_ENTRIES)
+
+def embed_query(text: str) -> List[float]:
+    """Embedding of a search query, memoised by text hash and model"""
+    key = make_key(EMBEDDING_MODEL, text)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = [float(x) for x in embedding_func([text])[0]]
+        query_embedding_cache.put(key, embedding)
+    return embedding
+
+def llm_json(prompt: str, schema: Any = "json", max_tokens: int = PARSE_MAX_TOKENS) -> Any:
+    """Structured (STRUCTURED_OUTPUT) or plain generation, parsed tolerantly; raises ValueError if unusable"""
+    if STRUCTURED_OUTPUT:
+        return generate_json(LLM_MODEL, prompt, schema, max_tokens)
+    return repair_json(llm.invoke(prompt))
+
+def extract_text_from_pdf(pdf_path: str, backend: str = EXTRACTION_BACKEND) -> str:
     """Extract raw text from PDF resume"""
-    with pdfplumber.open(pdf_path) as pdf:
-        return "\n".join(page.extract_text() for page in pdf.pages)
+    return extract_text(pdf_path, backend)
 
 def parse_cv(pdf_text: str) -> Dict:
     """Convert raw CV text to structured data using LLM with both hard and soft skills extraction"""
@@ -94,53 +205,124 @@ def parse_cv(pdf_text: str) -> Dict:
     For technical_skills, extract hard/technical/domain-specific skills relevant to any industry.
     For soft_skills, extract interpersonal abilities, traits and transferable skills.
     """
-    response = llm.invoke(prompt)
     try:
-        return json.loads(response.split("```json")[1].split("```")[0].strip())
-    except:
-        return {
-            "name": "Unknown",
-            "email": "unknown@example.com",
-            "technical_skills": [],
-            "soft_skills": [],
-            "experience": [],
-            "education": ""
-        }
+        return llm_json(prompt, CV_SCHEMA, PARSE_MAX_TOKENS)
+    except Exception as e:
+        print(f"CV parsing failed: {str(e)}")
+        return parse_fallback()
+
+def parse_fallback() -> Dict:
+    """What parse_cv returns when the LLM call fails"""
+    return {
+        "name": "Unknown",
+        "email": "unknown@example.com",
+        "technical_skills": [],
+        "soft_skills": [],
+        "experience": [],
+        "education": ""
+    }
+
+def skill_key(skill: str) -> str:
+    """Metadata key for a skill: lower-cased with whitespace collapsed"""
+    return SKILL_KEY_PREFIX + " ".join(str(skill).lower().split())
+
+def total_years_experience(experience: List) -> float:
+    total = 0.0
+    for exp in experience:
+        years = exp.get("years", 0) if isinstance(exp, dict) else getattr(exp, "years", 0)
+        try:
+            total += float(years)
+        except (TypeError, ValueError):
+            continue
+    return total
+
+def education_level(education: str) -> int:
+    """0 (unknown/none) to 4 (doctorate)"""
+    text = str(education).lower()
+    for level, keywords in EDUCATION_LEVELS:
+        if any(keyword in text for keyword in keywords):
+            return level
+    return 0
+
+def split_list(value: Any) -> List[str]:
+    """Decode a list field; values stored by the old layout are JSON arrays"""
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+    if value.startswith("["):
+        return json.loads(value)
+    return value.split(LIST_SEPARATOR)
 
 def prepare_metadata(cv_data: Dict) -> Dict:
     """Convert CV data to ChromaDB-compatible metadata"""
-    return {
+    technical_skills = [str(s) for s in cv_data.get("technical_skills", []) if str(s).strip()]
+    soft_skills = [str(s) for s in cv_data.get("soft_skills", []) if str(s).strip()]
+    experience = [exp if isinstance(exp, dict) else exp.__dict__ 
+                  for exp in cv_data.get("experience", [])]
+    metadata = {
         "name": str(cv_data.get("name", "")),
         "email": str(cv_data.get("email", "")),
-        "technical_skills": json.dumps(cv_data.get("technical_skills", [])),
-        "soft_skills": json.dumps(cv_data.get("soft_skills", [])),
-        "experience": json.dumps([exp if isinstance(exp, dict) else exp.__dict__ 
-                                for exp in cv_data.get("experience", [])]),
-        "education": str(cv_data.get("education", ""))
+        "technical_skills": LIST_SEPARATOR.join(s.replace(LIST_SEPARATOR, "/") for s in technical_skills),
+        "soft_skills": LIST_SEPARATOR.join(s.replace(LIST_SEPARATOR, "/") for s in soft_skills),
+        "experience": json.dumps(experience),  # Display only, decoded on demand
+        "education": str(cv_data.get("education", "")),
+        "total_years_experience": total_years_experience(experience),
+        "education_level": education_level(cv_data.get("education", "")),
     }
+    for skill in technical_skills + soft_skills:
+        metadata[skill_key(skill)] = True
+    return metadata
+
+def cv_skills(cv_data: Dict) -> List[str]:
+    return [str(s) for s in cv_data.get("technical_skills", []) + cv_data.get("soft_skills", [])]
+
+def build_candidate_filter(skills: Optional[List[str]] = None,
+                           min_years: Optional[float] = None,
+                           min_education_level: Optional[int] = None) -> Optional[Dict]:
+    """
+    Chroma `where` filter for candidates that have all `skills`, at least
+    `min_years` of experience and at least `min_education_level`.
+
+    e.g. build_candidate_filter(["C#"], min_years=3)
+    """
+    clauses = [{skill_key(skill): {"$eq": True}} for skill in skills or []]
+    if min_years is not None:
+        clauses.append({"total_years_experience": {"$gte": float(min_years)}})
+    if min_education_level is not None:
+        clauses.append({"education_level": {"$gte": int(min_education_level)}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 def generate_document_id(file_path: str) -> str:
-    """Generate a consistent document ID from file path"""
+    """Generate a consistent document ID from file content, so renames keep their ID"""
+    return content_document_id(file_sha256(file_path))
+
+def content_document_id(content_hash: str) -> str:
+    return content_hash[:32]
+
+def legacy_document_id(file_path: str) -> str:
+    """Path-based ID used before documents were keyed by content"""
     return hashlib.md5(file_path.encode()).hexdigest()
 
 def embed_and_store_cv(pdf_path: str, pdf_text: str, cv_data: Dict) -> str:
     """Embed CV text and store in ChromaDB with metadata"""
-    global cv_collection
-    
-    # Ensure collection is initialized
-    if cv_collection is None:
-        cv_collection = initialize_chroma_collection()
-    
     doc_id = generate_document_id(pdf_path)
     metadata = prepare_metadata(cv_data)
     
     # Simple add with upsert=True (will update if exists)
     try:
+        embeddings = embedding_func([pdf_text])
+        if use_quantized_index():
+            quantized_index.add([doc_id], embeddings)
         cv_collection.upsert(
             ids=[doc_id],
+            embeddings=collection_embeddings(embeddings),
             documents=[pdf_text],
             metadatas=[metadata]
         )
+        bm25_index.add(doc_id, pdf_text, cv_skills(cv_data))
         print(f"Successfully stored document: {doc_id}")
     except Exception as e:
         print(f"Error storing document {doc_id}: {str(e)}")
@@ -155,6 +337,7 @@ def embed_and_store_cv(pdf_path: str, pdf_text: str, cv_data: Dict) -> str:
             # Then add fresh
             cv_collection.add(
                 ids=[doc_id],
+                embeddings=collection_embeddings(embedding_func([pdf_text])),
                 documents=[pdf_text],
                 metadatas=[metadata]
             )
@@ -164,20 +347,426 @@ def embed_and_store_cv(pdf_path: str, pdf_text: str, cv_data: Dict) -> str:
     
     return doc_id
 
-def get_similar_cvs(query_text: str, n_results: int = 5) -> List[Dict[str, Any]]:
-    """Find similar CVs based on text query using vector similarity"""
-    global cv_collection
+class StageStats:
+    """Throughput counters for one bulk-ingestion stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float, errors: int = 0):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.busy_seconds += seconds
+
+    def as_dict(self, wall_seconds: float) -> Dict:
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall_seconds, 2) if wall_seconds else 0.0,
+            "items_per_busy_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+        }
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+def bulk_ingest(cv_paths: List[str],
+                doc_ids: Optional[Dict[str, str]] = None,
+                parse_workers: int = INGEST_PARSE_WORKERS,
+                embed_batch_size: int = INGEST_EMBED_BATCH_SIZE,
+                upsert_batch_size: int = INGEST_UPSERT_BATCH_SIZE,
+                queue_size: int = INGEST_QUEUE_SIZE) -> Dict[str, Any]:
+    """
+    Ingest many CVs through concurrent stages joined by bounded queues:
+    extraction (process pool) -> parsing (threads) -> batched embedding
+    -> batched Chroma upserts.
     
-    # Ensure collection is initialized
-    if cv_collection is None:
-        cv_collection = initialize_chroma_collection()
+    Returns {"documents": [...], "errors": [...], "stats": {...}} where each
+    document has cv_file, cv_id, text and cv_data, and stats reports
+    per-stage throughput. `doc_ids` optionally maps paths to precomputed
+    document IDs. Paths sharing a document ID (byte-identical files) are
+    processed once and each gets its own document or error entry.
+    """
+    parse_queue = queue.Queue(maxsize=queue_size)
+    embed_queue = queue.Queue(maxsize=queue_size)
+    upsert_queue = queue.Queue(maxsize=max(1, queue_size // embed_batch_size))
+    stats = {name: StageStats(name) for name in ("extract", "parse", "embed", "upsert")}
+    documents, errors = [], []
+    results_lock = threading.Lock()
+    
+    def fail(path: str, stage: str, message: str):
+        print(f"Skipped {path} during {stage}: {message}")
+        with results_lock:
+            errors.extend({"cv_file": alias, "stage": stage, "message": message}
+                          for alias in aliases.get(path, [path]))
     
+    # One representative path per document ID goes through the stages, so an
+    # upsert never carries the same ID twice (Chroma rejects the whole batch)
+    ids: Dict[str, str] = {}
+    aliases: Dict[str, List[str]] = {}
+    representatives: Dict[str, str] = {}
+    for path in dict.fromkeys(cv_paths):
+        try:
+            doc_id = (doc_ids or {}).get(path) or generate_document_id(path)
+        except OSError as e:
+            fail(path, "extract", str(e))
+            continue
+        representative = representatives.setdefault(doc_id, path)
+        ids[representative] = doc_id
+        aliases.setdefault(representative, []).append(path)
+    unique_paths = list(representatives.values())
+    
+    def extract_stage():
+        chunk = EXTRACTION_WORKERS * 4
+        handled = set()
+        try:
+            for start in range(0, len(unique_paths), chunk):
+                paths = unique_paths[start:start + chunk]
+                started = time.perf_counter()
+                extracted = extract_texts(paths)
+                failed = 0
+                for path in paths:
+                    outcome = extracted.get(path, {"status": "error", "message": "No extraction result"})
+                    if outcome["status"] == "success" and outcome["text"].strip():
+                        parse_queue.put((path, outcome["text"]))
+                    else:
+                        failed += 1
+                        fail(path, "extract", outcome.get("message", "Empty or image-only PDF"))
+                    handled.add(path)
+                stats["extract"].record(len(paths) - failed, time.perf_counter() - started, failed)
+        except Exception as e:
+            # Report what was never handed on as failed rather than losing it silently
+            unhandled = [path for path in unique_paths if path not in handled]
+            stats["extract"].record(0, 0.0, len(unhandled))
+            for path in unhandled:
+                fail(path, "extract", str(e))
+        finally:
+            # Always release the downstream stages, or bulk_ingest waits on them forever
+            for _ in range(parse_workers):
+                parse_queue.put(_DONE)
+    
+    def parse_stage():
+        while (item := parse_queue.get()) is not _DONE:
+            path, text = item
+            started = time.perf_counter()
+            try:
+                cv_data = parse_cv(text)
+                if cv_data == parse_fallback():  # parse_cv swallows LLM errors; don't index an "Unknown" candidate
+                    raise ValueError("LLM parse failed")
+                embed_queue.put((path, text, cv_data))
+                stats["parse"].record(1, time.perf_counter() - started)
+            except Exception as e:
+                stats["parse"].record(0, time.perf_counter() - started, 1)
+                fail(path, "parse", str(e))
+        embed_queue.put(_DONE)
+    
+    def embed_batch(batch: List[tuple]):
+        started = time.perf_counter()
+        try:
+            embeddings = embedding_func([text for _, text, _ in batch])
+            upsert_queue.put((batch, embeddings))
+            stats["embed"].record(len(batch), time.perf_counter() - started)
+        except Exception as e:
+            stats["embed"].record(0, time.perf_counter() - started, len(batch))
+            for path, _, _ in batch:
+                fail(path, "embed", str(e))
+    
+    def embed_stage():
+        batch, finished_parsers = [], 0
+        while finished_parsers < parse_workers:
+            item = embed_queue.get()
+            if item is _DONE:
+                finished_parsers += 1
+                continue
+            batch.append(item)
+            if len(batch) >= embed_batch_size:
+                embed_batch(batch)
+                batch = []
+        if batch:
+            embed_batch(batch)
+        upsert_queue.put(_DONE)
+    
+    def upsert_batch(pending: List[tuple]):
+        started = time.perf_counter()
+        try:
+            batch_ids = [ids[path] for path, _, _, _ in pending]
+            embeddings = [embedding for _, _, _, embedding in pending]
+            # Vectors first: a document Chroma returns must be searchable
+            if use_quantized_index():
+                quantized_index.add(batch_ids, embeddings)
+            cv_collection.upsert(
+                ids=batch_ids,
+                embeddings=collection_embeddings(embeddings),
+                documents=[text for _, text, _, _ in pending],
+                metadatas=[prepare_metadata(cv_data) for _, _, cv_data, _ in pending]
+            )
+            bm25_index.add_many(
+                (doc_id, text, cv_skills(cv_data)) for doc_id, (_, text, cv_data, _) in zip(batch_ids, pending)
+            )
+            stats["upsert"].record(len(pending), time.perf_counter() - started)
+        except Exception as e:
+            stats["upsert"].record(0, time.perf_counter() - started, len(pending))
+            for path, _, _, _ in pending:
+                fail(path, "upsert", str(e))
+            return
+        with results_lock:
+            documents.extend(
+                {"cv_file": alias, "cv_id": doc_id, "text": text, "cv_data": cv_data}
+                for (path, text, cv_data, _), doc_id in zip(pending, batch_ids)
+                for alias in aliases[path]
+            )
+    
+    def upsert_stage():
+        pending = []
+        while (item := upsert_queue.get()) is not _DONE:
+            batch, embeddings = item
+            pending.extend((path, text, cv_data, embedding)
+                           for (path, text, cv_data), embedding in zip(batch, embeddings))
+            if len(pending) >= upsert_batch_size:
+                upsert_batch(pending)
+                pending = []
+        if pending:
+            upsert_batch(pending)
+    
+    started = time.perf_counter()
+    threads = [threading.Thread(target=extract_stage, name="ingest-extract")]
+    threads += [threading.Thread(target=parse_stage, name=f"ingest-parse-{i}") for i in range(parse_workers)]
+    threads += [threading.Thread(target=embed_stage, name="ingest-embed"),
+                threading.Thread(target=upsert_stage, name="ingest-upsert")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+    
+    report = {name: stage.as_dict(wall_seconds) for name, stage in stats.items()}
+    report["wall_seconds"] = round(wall_seconds, 3)
+    print(f"Ingested {len(documents)}/{len(cv_paths)} CVs in {wall_seconds:.1f}s: "
+          + ", ".join(f"{name} {s['items_per_busy_second']}/busy-s" for name, s in report.items() if name != "wall_seconds"))
+    return {"documents": documents, "errors": errors, "stats": report}
+
+def migrate_metadata(batch_size: int = INGEST_UPSERT_BATCH_SIZE) -> int:
+    """
+    Rewrite documents stored with the old JSON-string metadata layout into
+    the filterable one. Works from the stored metadata alone, so nothing is
+    re-parsed or re-embedded. Returns the number of documents updated.
+    """
+    migrated, offset = 0, 0
+    while True:
+        page = cv_collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        ids, metadatas = [], []
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            if "education_level" in metadata:
+                continue
+            ids.append(doc_id)
+            metadatas.append(prepare_metadata({
+                **metadata,
+                "technical_skills": split_list(metadata.get("technical_skills", "")),
+                "soft_skills": split_list(metadata.get("soft_skills", "")),
+                "experience": json.loads(metadata.get("experience") or "[]"),
+            }))
+        if ids:
+            cv_collection.update(ids=ids, metadatas=metadatas)
+            migrated += len(ids)
+    print(f"Migrated metadata of {migrated} documents")
+    return migrated
+
+def build_quantized_index(index: Optional[QuantizedIndex] = None,
+                          batch_size: int = INGEST_UPSERT_BATCH_SIZE) -> int:
+    """
+    Fill a quantized index (the configured one by default) from the
+    embeddings in the exact-mode collection. In a quantized mode the
+    documents and metadata are copied to the metadata-only collection too;
+    the exact-mode collection can be deleted afterwards.
+    """
+    if index is None:
+        index = quantized_index.load()
+    added, offset = 0, 0
+    while True:
+        page = float_collection.get(include=["embeddings", "documents", "metadatas"],
+                                    limit=batch_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        offset += len(page["ids"])
+        index.add(list(page["ids"]), page["embeddings"])
+        if use_quantized_index():
+            cv_collection.upsert(ids=list(page["ids"]), embeddings=collection_embeddings(page["embeddings"]),
+                                 documents=page["documents"], metadatas=page["metadatas"])
+        added += len(page["ids"])
+    print(f"Built {index.mode} index over {added} documents")
+    return added
+
+def compare_quantized_recall(query_texts: Optional[List[str]] = None, k: int = 10,
+                             sample: int = 100) -> List[Dict[str, Any]]:
+    """
+    recall@k of each quantized mode against the exact search, with its
+    memory saving. Uses `query_texts` if given, otherwise a sample of the
+    CVs in the exact-mode collection as queries.
+    """
+    if query_texts:
+        queries = np.asarray(embedding_func(query_texts), dtype=np.float32)
+    else:
+        page = float_collection.get(include=["embeddings"], limit=sample)
+        queries = np.asarray(page["embeddings"], dtype=np.float32)
+    
+    reports = []
+    for mode in ("int8", "binary"):
+        index = load_quantized_index(mode)
+        if not len(index):
+            build_quantized_index(index)
+        report = index.recall_at_k(queries, k)
+        print(f"{mode}: recall@{k} {report['recall']}, {report['compression']}x smaller "
+              f"({report['quantized']} vs {report['float32']} bytes)")
+        reports.append(report)
+    return reports
+
+def build_bm25_index(batch_size: int = INGEST_UPSERT_BATCH_SIZE) -> int:
+    """(Re)build the keyword index from the documents already stored in Chroma"""
+    added, offset = 0, 0
+    while True:
+        page = cv_collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        bm25_index.add_many(
+            (doc_id, text or "", split_list(metadata.get("technical_skills", ""))
+                                 + split_list(metadata.get("soft_skills", "")))
+            for doc_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+        )
+        added += len(page["ids"])
+    print(f"Indexed {added} documents for keyword search")
+    return added
+
+def incremental_reindex(folder_path: str = "test_resumes",
+                        manifest_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bring the CV collection in line with a folder, doing work only for churn.
+    
+    Files whose size, mtime and model/prompt versions match the manifest
+    are skipped without hashing; files whose content is already indexed
+    (renamed or touched) just get their manifest entry updated; new and
+    changed files are ingested; documents of deleted files are dropped.
+    Files that fail to extract or parse are left out of the manifest, so
+    the next run retries them. Identical new files share one document and
+    are all recorded against it.
+    """
+    manifest = IngestManifest(manifest_path) if manifest_path else IngestManifest()
+    versions = {"llm_model": LLM_MODEL, "embedding_model": EMBEDDING_MODEL,
+                "prompt_version": PARSE_PROMPT_VERSION}
+    folder = os.path.abspath(folder_path)
+    current = {os.path.abspath(path): path for path in get_cv_files_from_folder(folder_path)}
+    previous_ids = manifest.doc_ids()
+    
+    report = {"unchanged": 0, "relinked": 0, "ingested": 0, "deleted": 0, "errors": []}
+    to_ingest, hashes = [], {}
+    for path in sorted(current):
+        if manifest.is_unchanged(path, versions):
+            report["unchanged"] += 1
+            continue
+        content_hash = file_sha256(path)
+        existing = manifest.find_by_hash(content_hash, versions)
+        if existing is not None:
+            manifest.record(path, content_hash, existing["doc_id"], versions)
+            report["relinked"] += 1
+        else:
+            hashes[path] = content_hash
+            to_ingest.append(path)
+    
+    # Forget files that disappeared from the folder
+    for path in [p for p in manifest.entries if os.path.dirname(p) == folder and p not in current]:
+        manifest.remove(path)
+    
+    if to_ingest:
+        doc_ids = {path: content_document_id(h) for path, h in hashes.items()}
+        ingested = bulk_ingest(to_ingest, doc_ids=doc_ids)
+        # Only successful parses enter the manifest; failed files stay "changed"
+        # and are retried on the next run instead of passing is_unchanged()
+        parsed = [doc for doc in ingested["documents"] if doc["cv_data"] != parse_fallback()]
+        for doc in parsed:
+            manifest.record(doc["cv_file"], hashes[doc["cv_file"]], doc["cv_id"], versions)
+        report["ingested"] = len(parsed)
+        report["errors"] = ingested["errors"]
+        report["stats"] = ingested["stats"]
+    
+    # Drop documents no file points at any more (deleted or changed files),
+    # plus path-keyed documents from before content-based IDs
+    stale_ids = previous_ids - manifest.doc_ids()
+    stale_ids |= {legacy_document_id(current[path]) for path in to_ingest}
+    if stale_ids:
+        try:
+            cv_collection.delete(ids=sorted(stale_ids))
+            if use_quantized_index():
+                quantized_index.remove(sorted(stale_ids))
+            bm25_index.remove(stale_ids)
+        except Exception as e:
+            print(f"Error deleting stale documents: {str(e)}")
+    report["deleted"] = len(previous_ids - manifest.doc_ids())
+    
+    manifest.save()
+    print(f"Re-index of {folder_path}: {report['unchanged']} unchanged, {report['relinked']} relinked, "
+          f"{report['ingested']} ingested, {report['deleted']} deleted")
+    return report
+
+def quantized_query(query_text: str, n_results: int, where: Optional[Dict] = None) -> Dict:
+    """Search the quantized index, returning results shaped like a Chroma query"""
+    candidates = None
+    if where:
+        candidates = cv_collection.get(where=where, include=[])["ids"]
+    hits = quantized_index.search(embed_query(query_text), n_results, candidates=candidates)
+    ids = [doc_id for doc_id, _ in hits]
+    stored = cv_collection.get(ids=ids, include=["metadatas"])
+    metadata_by_id = dict(zip(stored["ids"], stored["metadatas"]))
+    hits = [(doc_id, score) for doc_id, score in hits if doc_id in metadata_by_id]
+    return {
+        "ids": [[doc_id for doc_id, _ in hits]],
+        "metadatas": [[metadata_by_id[doc_id] for doc_id, _ in hits]],
+        "distances": [[1 - score for _, score in hits]],
+    }
+
+def format_cv_record(doc_id: str, metadata: Dict, similarity: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Decode stored metadata into a candidate record (None if it cannot be parsed)"""
+    try:
+        return {
+            'id': doc_id,
+            'name': metadata.get('name', 'Unknown'),
+            'email': metadata.get('email', 'unknown@example.com'),
+            'technical_skills': split_list(metadata.get('technical_skills', '')),
+            'soft_skills': split_list(metadata.get('soft_skills', '')),
+            'experience': json.loads(metadata.get('experience') or '[]'),
+            'education': metadata.get('education', ''),
+            'total_years_experience': metadata.get('total_years_experience'),
+            'education_level': metadata.get('education_level'),
+            'similarity': similarity
+        }
+    except Exception as e:
+        print(f"Error parsing metadata for document {doc_id}: {str(e)}")
+        return None
+
+def get_similar_cvs(query_text: str, n_results: int = 5,
+                    where: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    """
+    Find similar CVs based on text query using vector similarity
+
+    `where` is a Chroma metadata filter (see build_candidate_filter); it is
+    applied inside the search, so only eligible CVs are scanned.
+    """
     # Query the collection
     try:
-        results = cv_collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
+        if use_quantized_index():
+            results = quantized_query(query_text, n_results, where)
+        else:
+            results = cv_collection.query(
+                query_embeddings=[embed_query(query_text)],
+                n_results=n_results,
+                where=where
+            )
     except Exception as e:
         print(f"Error querying CV collection: {str(e)}")
         return []
@@ -185,26 +774,10 @@ def get_similar_cvs(query_text: str, n_results: int = 5) -> List[Dict[str, Any]]
     formatted_results = []
     if results and results.get('ids') and results.get('metadatas'):
         for i, doc_id in enumerate(results['ids'][0]):
-            metadata = results['metadatas'][0][i]
-            try:
-                # Parse JSON strings back to lists
-                technical_skills = json.loads(metadata.get('technical_skills', '[]'))
-                soft_skills = json.loads(metadata.get('soft_skills', '[]'))
-                experience = json.loads(metadata.get('experience', '[]'))
-                
-                formatted_results.append({
-                    'id': doc_id,
-                    'name': metadata.get('name', 'Unknown'),
-                    'email': metadata.get('email', 'unknown@example.com'),
-                    'technical_skills': technical_skills,
-                    'soft_skills': soft_skills,
-                    'experience': experience,
-                    'education': metadata.get('education', ''),
-                    'similarity': 1 - results['distances'][0][i] if 'distances' in results else None 
-                })
-            except Exception as e:
-                print(f"Error parsing metadata for document {doc_id}: {str(e)}")
-                continue
+            similarity = 1 - results['distances'][0][i] if 'distances' in results else None
+            record = format_cv_record(doc_id, results['metadatas'][0][i], similarity)
+            if record is not None:
+                formatted_results.append(record)
     
     return formatted_results
 
@@ -277,11 +850,8 @@ def score_cv(cv_data: Dict, job_desc: str, tech_weight: float = 0.7, soft_weight
     - Domain fit should be a short phrase describing industry relevance
     """
     
-    response = llm.invoke(prompt)
-    
     try:
-        json_str = response.split("```json")[1].split("```")[0].strip()
-        result = json.loads(json_str)
+        result = llm_json(prompt, SCORE_SCHEMA, SCORE_MAX_TOKENS)
         
         # Get matches, ensuring we handle empty lists
         matches = result.get("key_matches", [])
@@ -331,8 +901,21 @@ def semantic_match_job_to_candidates(job_desc: str, top_n: int = 5) -> List[Dict
     
     return sorted(results, key=lambda x: x["relevance_score"], reverse=True)
 
+def job_similarities(job_desc: str, doc_ids: List[str]) -> Dict[str, float]:
+    """Cosine similarity between the job description and stored CV embeddings"""
+    if use_quantized_index():
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in quantized_index.full]
+        sims = quantized_index.full.similarities(embed_query(job_desc), doc_ids)
+        return dict(zip(doc_ids, sims.tolist()))
+    stored = cv_collection.get(ids=doc_ids, include=["embeddings"])
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    job_vec = np.asarray(embed_query(job_desc), dtype=np.float32)
+    sims = matrix @ job_vec / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(job_vec) + 1e-12)
+    return dict(zip(stored["ids"], sims.tolist()))
+
 def process_job_applications(job_desc: str, cv_paths: List[str], 
-                            tech_weight: float = 0.7, soft_weight: float = 0.3) -> List[Dict]:
+                            tech_weight: float = 0.7, soft_weight: float = 0.3,
+                            prefilter_k: Optional[int] = None) -> List[Dict]:
     """
     Main pipeline with industry-agnostic weighted scoring and embedding
     
@@ -341,20 +924,24 @@ def process_job_applications(job_desc: str, cv_paths: List[str],
         cv_paths: List of paths to CV PDF files
         tech_weight: Weight for technical/hard skills (default 0.7)
         soft_weight: Weight for soft skills (default 0.3)
+        prefilter_k: If set, only the prefilter_k CVs most similar to the job
+                     are LLM-scored; the rest are returned last with "skipped": True
     """
-    results = []
-    
     # First process and store all CVs with embeddings
-    for path in cv_paths:
+    ingested = bulk_ingest(cv_paths)
+    processed = [(doc["cv_file"], doc["cv_id"], doc["cv_data"]) for doc in ingested["documents"]]
+    
+    # Optionally keep only the most similar CVs for the expensive LLM step
+    skipped = []
+    if prefilter_k is not None and len(processed) > prefilter_k:
+        sims = job_similarities(job_desc, [doc_id for _, doc_id, _ in processed])
+        processed.sort(key=lambda item: sims.get(item[1], 0.0), reverse=True)
+        processed, skipped = processed[:prefilter_k], processed[prefilter_k:]
+    
+    # Score against job description
+    results = []
+    for path, doc_id, cv_data in processed:
         try:
-            print(f"Processing {path}...")
-            text = extract_text_from_pdf(path)
-            cv_data = parse_cv(text)
-            
-            # Store with embeddings
-            doc_id = embed_and_store_cv(path, text, cv_data)
-            
-            # Score against job description
             scored = score_cv(cv_data, job_desc, tech_weight, soft_weight)
             results.append({
                 "cv_file": path,
@@ -365,7 +952,20 @@ def process_job_applications(job_desc: str, cv_paths: List[str],
         except Exception as e:
             print(f"Skipped {path} due to error: {str(e)}")
     
-    return sorted(results, key=lambda x: x["relevance_score"], reverse=True)
+    results.sort(key=lambda x: x["relevance_score"], reverse=True)
+    results.extend({
+        "cv_file": path,
+        "cv_id": doc_id,
+        "applicant": cv_data.get("name", "Unknown"),
+        "skipped": True,
+        "relevance_score": 0,
+        "justification": "Skipped by embedding pre-filter",
+        "key_matches": ["None"],
+        "missing_requirements": [],
+        "soft_skills": [],
+        "domain_fit": "None"
+    } for path, doc_id, cv_data in skipped)
+    return results
 
 def search_cv_by_query(query_text: str, top_n: int = 5) -> List[Dict]:
     """
@@ -396,20 +996,61 @@ def get_cv_files_from_folder(folder_path: str = "test_resumes") -> List[str]:
     
     return glob.glob(os.path.join(folder_path, "*.pdf"))
 
+def hybrid_retrieve(query_text: str, n_results: int, where: Optional[Dict] = None,
+                    sparse_weight: float = HYBRID_SPARSE_WEIGHT) -> List[Dict]:
+    """Dense and BM25 candidates fused by reciprocal rank fusion, best first"""
+    dense = get_similar_cvs(query_text, n_results=n_results, where=where)
+    if not sparse_weight:
+        return dense
+    
+    try:
+        eligible = cv_collection.get(where=where, include=[])["ids"] if where else None
+        sparse = bm25_index.search(query_text, k=n_results, candidates=eligible)
+    except Exception as e:
+        print(f"Error querying keyword index: {str(e)}")
+        return dense
+    
+    fused = reciprocal_rank_fusion(
+        [[candidate["id"] for candidate in dense], [doc_id for doc_id, _ in sparse]],
+        weights=[1.0, sparse_weight]
+    )[:n_results]
+    bm25_scores = dict(sparse)
+    records = {candidate["id"]: candidate for candidate in dense}
+    
+    # Keyword-only hits still need their metadata and a dense similarity
+    missing = [doc_id for doc_id, _ in fused if doc_id not in records]
+    if missing:
+        stored = cv_collection.get(ids=missing, include=["metadatas"])
+        similarities = job_similarities(query_text, missing)
+        for doc_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            record = format_cv_record(doc_id, metadata, similarities.get(doc_id))
+            if record is not None:
+                records[doc_id] = record
+    
+    return [{**records[doc_id], "bm25_score": bm25_scores.get(doc_id, 0.0), "fusion_score": score}
+            for doc_id, score in fused if doc_id in records]
+
 def hybrid_job_matching(job_desc: str, top_n: int = 5, 
                        semantic_weight: float = 0.4, 
-                       scoring_weight: float = 0.6) -> List[Dict]:
+                       scoring_weight: float = 0.6,
+                       where: Optional[Dict] = None,
+                       sparse_weight: float = HYBRID_SPARSE_WEIGHT) -> List[Dict]:
     """
     Combined ranking using both semantic similarity and LLM scoring
     
+    Candidates are retrieved by vector search and by BM25 keyword search
+    (exact terms such as "Entity Framework"), fused with reciprocal rank
+    fusion, and only the fused top top_n*2 are sent to the LLM.
+    
     Parameters:
         job_desc: Job description text
         top_n: Number of candidates to return
         semantic_weight: Weight for embedding similarity (0-1)
         scoring_weight: Weight for LLM scoring (0-1)
+        where: Optional metadata filter, e.g. build_candidate_filter(["C#"], min_years=3)
+        sparse_weight: Weight of the BM25 ranking in the fusion (0 = dense only)
     """
-    # Get semantically similar candidates
-    similar_candidates = get_similar_cvs(job_desc, n_results=top_n*2)
+    similar_candidates = hybrid_retrieve(job_desc, top_n*2, where, sparse_weight)
     
     # Score and combine metrics
     scored_candidates = []
@@ -438,8 +1079,7 @@ def hybrid_job_matching(job_desc: str, top_n: int = 5,
 def setup_script():
     """Initialize all required components"""
     print("Initializing mxbai embedding model...")
-    global cv_collection
-    cv_collection = initialize_chroma_collection()
+    warm_up(embedding_func, chroma_client, cv_collection, llm)
     print("ChromaDB collection initialized.")
 
 # Example execution
@@ -447,6 +1087,26 @@ if __name__ == "__main__":
     # Initialize components first
     setup_script()
     
+    # Nightly mode: only sync the collection with test_resumes
+    if "--reindex" in sys.argv:
+        incremental_reindex()
+        exit()
+    
+    # One-off: convert documents stored with the old metadata layout
+    if "--migrate-metadata" in sys.argv:
+        migrate_metadata()
+        exit()
+    
+    # Compare recall and memory of the quantized modes with exact search
+    if "--quantized-recall" in sys.argv:
+        compare_quantized_recall()
+        exit()
+    
+    # One-off: build the keyword index for documents ingested before it existed
+    if "--build-bm25" in sys.argv:
+        build_bm25_index()
+        exit()
+    
     job_description = """
     Full Stack ASP.NET Developer (3+ years experience)
 
@@ -514,6 +1174,8 @@ if __name__ == "__main__":
             print(f"Domain Fit: {result['domain_fit']}")
             print(f"Matches: {', '.join(result['key_matches'])}")
             print(f"Missing: {', '.join(result['missing_requirements'])}")
+        
+        print(f"\nQuery embedding cache: {query_embedding_cache.stats()}")
 
     except Exception as e:
         print(f"Error processing CVs: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,261 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+# ------ Configuration ------
+# Category weights of the score_cv rubric
+HARD_SKILLS_WEIGHT = 0.50
+EXPERIENCE_WEIGHT = 0.20
+EDUCATION_WEIGHT = 0.15
+DOMAIN_WEIGHT = 0.10
+SOFT_SKILLS_WEIGHT = 0.05
+REQUIRED_SHARE = 0.7  # Share of the hard-skills category for required skills; bonus skills get the rest
+PARTIAL_MATCH = 0.5  # Credit for a related skill (e.g. "sql" for "sql server")
+PARTIAL_OVERLAP = 0.5  # Share of a skill's tokens that must be shared for a partial match
+
+# Spellings folded together before matching
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "postgres": "postgresql",
+    "mssql": "sql server",
+    "ms sql server": "sql server",
+    "microsoft sql server": "sql server",
+    "dotnet": ".net",
+    "ef": "entity framework",
+    "ef core": "entity framework core",
+    "k8s": "kubernetes",
+    "html5": "html",
+    "css3": "css",
+    "ml": "machine learning",
+}
+
+EDUCATION_KEYWORDS = ("phd", "doctorate", "master", "msc", "mba", "bachelor", "bsc", "degree", "diploma")
+YEARS_PATTERN = re.compile(r"(\d+)\s*\+?\s*(?:years?|yrs?)", re.IGNORECASE)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9+#]+(?:\.[a-z0-9+#]+)*|\.[a-z]+")
+
+
+# ------ Normalisation ------
+def normalise_skill(skill: str) -> str:
+    """Lower-case, collapse whitespace and punctuation, fold known aliases"""
+    text = " ".join(_TOKEN_PATTERN.findall(str(skill).lower()))
+    return SKILL_ALIASES.get(text, text)
+
+
+def normalise_skills(skills: Sequence) -> List[str]:
+    return list(dict.fromkeys(s for s in (normalise_skill(skill) for skill in skills or []) if s))
+
+
+def normalise_requirements(raw: Dict) -> Dict:
+    """
+    Clean requirements extracted for a job into:
+    {"required_skills", "bonus_skills", "soft_skills": [normalised skills],
+     "min_years": float | None, "education": [phrases], "domain": [phrases]}
+    """
+    min_years = raw.get("min_years")
+    try:
+        min_years = float(min_years) if min_years not in (None, "") else None
+    except (TypeError, ValueError):
+        min_years = None
+    required = normalise_skills(raw.get("required_skills"))
+    return {
+        "required_skills": required,
+        "bonus_skills": [s for s in normalise_skills(raw.get("bonus_skills")) if s not in required],
+        "soft_skills": normalise_skills(raw.get("soft_skills")),
+        "min_years": min_years,
+        "education": [str(e).lower().strip() for e in raw.get("education") or [] if str(e).strip()],
+        "domain": [str(d).lower().strip() for d in raw.get("domain") or [] if str(d).strip()],
+    }
+
+
+def requirements_from_text(job_desc: str, vocabulary: Sequence[str],
+                           soft_vocabulary: Sequence[str] = ()) -> Dict:
+    """
+    Deterministic fallback when no extracted requirements are available:
+    every known skill that appears in the description counts as required,
+    and the largest "N years" figure is the experience requirement.
+    """
+    text = " " + " ".join(_TOKEN_PATTERN.findall(job_desc.lower())) + " "
+
+    def mentioned(skills: Sequence[str]) -> List[str]:
+        return [s for s in normalise_skills(skills) if f" {s} " in text]
+
+    years = [int(y) for y in YEARS_PATTERN.findall(job_desc)]
+    return {
+        "required_skills": mentioned(vocabulary),
+        "bonus_skills": [],
+        "soft_skills": mentioned(soft_vocabulary),
+        "min_years": float(max(years)) if years else None,
+        "education": [k for k in EDUCATION_KEYWORDS if f" {k} " in text],
+        "domain": [],
+    }
+
+
+# ------ Skill matching ------
+def _token_matrix(phrases: List[str], token_ids: Dict[str, int]) -> sparse.csr_matrix:
+    rows, cols = [], []
+    for i, phrase in enumerate(phrases):
+        for token in set(phrase.split()):
+            rows.append(i)
+            cols.append(token_ids.setdefault(token, len(token_ids)))
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                             shape=(len(phrases), max(len(token_ids), 1)))
+
+
+def skill_match_matrix(candidate_skills: List[List[str]], requirements: List[str]) -> np.ndarray:
+    """
+    Candidates x requirements matrix of match credit: 1.0 for an exact
+    (normalised) match, PARTIAL_MATCH for a related skill sharing most of
+    its tokens, else 0. Computed with sparse products over the vocabulary.
+    """
+    if not requirements or not candidate_skills:
+        return np.zeros((len(candidate_skills), len(requirements)), dtype=np.float32)
+
+    vocabulary: Dict[str, int] = {}
+    rows, cols = [], []
+    for i, skills in enumerate(candidate_skills):
+        for skill in skills:
+            rows.append(i)
+            cols.append(vocabulary.setdefault(skill, len(vocabulary)))
+    vocab = list(vocabulary)
+    candidates = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                   shape=(len(candidate_skills), max(len(vocab), 1)))
+
+    # Vocabulary x requirements: exact matches, then partial ones via shared tokens
+    exact = sparse.lil_matrix((max(len(vocab), 1), len(requirements)), dtype=np.float32)
+    for j, requirement in enumerate(requirements):
+        if requirement in vocabulary:
+            exact[vocabulary[requirement], j] = 1.0
+
+    token_ids: Dict[str, int] = {}
+    vocab_tokens = _token_matrix(vocab, token_ids)
+    requirement_tokens = _token_matrix(requirements, token_ids)
+    vocab_tokens.resize((vocab_tokens.shape[0], len(token_ids)))
+    requirement_tokens.resize((requirement_tokens.shape[0], len(token_ids)))
+    shared = (vocab_tokens @ requirement_tokens.T).tocoo()
+    vocab_sizes = np.asarray(vocab_tokens.sum(axis=1)).ravel()
+    requirement_sizes = np.asarray(requirement_tokens.sum(axis=1)).ravel()
+    related = ((shared.data / requirement_sizes[shared.col] >= PARTIAL_OVERLAP)
+               | (shared.data / vocab_sizes[shared.row] >= PARTIAL_OVERLAP))
+    partial = sparse.csr_matrix(
+        (np.ones(int(related.sum()), dtype=np.float32), (shared.row[related], shared.col[related])),
+        shape=exact.shape,
+    )
+
+    has_exact = (candidates @ exact.tocsr()).toarray() > 0
+    has_partial = (candidates @ partial).toarray() > 0
+    return np.where(has_exact, 1.0, np.where(has_partial, PARTIAL_MATCH, 0.0)).astype(np.float32)
+
+
+# ------ Rubric components ------
+def _coverage(matches: np.ndarray) -> np.ndarray:
+    """Mean match credit per candidate; NaN when there are no requirements"""
+    return matches.mean(axis=1) if matches.shape[1] else np.full(matches.shape[0], np.nan)
+
+
+def _experience_scores(years: np.ndarray, min_years: Optional[float]) -> np.ndarray:
+    if min_years is None:
+        return np.where(years > 0, 1.0, 0.0)
+    shortfall = min_years - years
+    return np.select(
+        [years <= 0, shortfall <= 0, shortfall < 1, shortfall <= 2],
+        [0.0, 1.0, 0.75, 0.5],
+        default=0.2,
+    )
+
+
+def _phrase_score(text: str, phrases: List[str]) -> tuple:
+    """(1.0, phrase) for a direct match, (0.5, phrase) if a phrase shares a token, else (0.0, None)"""
+    text = text.lower()
+    for phrase in phrases:
+        if phrase in text:
+            return 1.0, phrase
+    words = set(_TOKEN_PATTERN.findall(text))
+    for phrase in phrases:
+        if words & set(_TOKEN_PATTERN.findall(phrase)) - set(EDUCATION_KEYWORDS):
+            return PARTIAL_MATCH, phrase
+    return 0.0, None
+
+
+def _candidate_years(cv_data: Dict) -> float:
+    total = 0.0
+    for exp in cv_data.get("experience", []) or []:
+        try:
+            total += float(exp.get("years", 0) if isinstance(exp, dict) else 0)
+        except (TypeError, ValueError):
+            continue
+    return total
+
+
+# ------ Scoring ------
+def score_candidates(cv_records: List[Dict], requirements: Dict) -> List[Dict]:
+    """
+    Score every CV against normalised job requirements with the score_cv
+    rubric, all candidates at once. Returns one dict per CV in the same
+    schema as score_cv.
+    """
+    if not cv_records:
+        return []
+
+    hard_skills = [normalise_skills(cv.get("technical_skills")) for cv in cv_records]
+    soft_skills = [normalise_skills(cv.get("soft_skills")) for cv in cv_records]
+    all_skills = [h + s for h, s in zip(hard_skills, soft_skills)]
+
+    required = skill_match_matrix(all_skills, requirements["required_skills"])
+    bonus = skill_match_matrix(all_skills, requirements["bonus_skills"])
+    soft = skill_match_matrix(soft_skills, requirements["soft_skills"])
+
+    required_cov, bonus_cov = _coverage(required), _coverage(bonus)
+    if requirements["required_skills"] and requirements["bonus_skills"]:
+        hard = REQUIRED_SHARE * required_cov + (1 - REQUIRED_SHARE) * bonus_cov
+    else:
+        hard = np.nan_to_num(np.where(np.isnan(required_cov), bonus_cov, required_cov))
+    soft_cov = np.nan_to_num(_coverage(soft))
+
+    years = np.array([_candidate_years(cv) for cv in cv_records], dtype=np.float32)
+    experience = _experience_scores(years, requirements["min_years"])
+
+    education, domain, domain_phrases = [], [], []
+    for cv in cv_records:
+        if requirements["education"]:
+            score, _ = _phrase_score(str(cv.get("education", "")), requirements["education"])
+        else:
+            score = 1.0 if str(cv.get("education", "")).strip() else 0.0
+        education.append(score)
+        history = " ".join(f"{e.get('role', '')} {e.get('company', '')}"
+                           for e in cv.get("experience", []) or [] if isinstance(e, dict))
+        score, phrase = _phrase_score(f"{history} {' '.join(cv.get('technical_skills', []) or [])}",
+                                      requirements["domain"])
+        domain.append(score)
+        domain_phrases.append(phrase)
+
+    relevance = 100 * (HARD_SKILLS_WEIGHT * hard
+                       + EXPERIENCE_WEIGHT * experience
+                       + EDUCATION_WEIGHT * np.array(education)
+                       + DOMAIN_WEIGHT * np.array(domain)
+                       + SOFT_SKILLS_WEIGHT * soft_cov)
+
+    results = []
+    for i in range(len(cv_records)):
+        matched = [s for s, credit in zip(requirements["required_skills"] + requirements["bonus_skills"],
+                                          np.concatenate([required[i], bonus[i]])) if credit > 0]
+        missing = [s for s, credit in zip(requirements["required_skills"], required[i]) if credit == 0]
+        matched_soft = [s for s, credit in zip(requirements["soft_skills"], soft[i]) if credit > 0]
+        required_hits = int((required[i] == 1.0).sum())
+        justification = (
+            f"The candidate matches {required_hits} of {len(requirements['required_skills'])} required skills"
+            + (f" with {years[i]:g} years of experience against {requirements['min_years']:g} required"
+               if requirements["min_years"] is not None else f" with {years[i]:g} years of experience")
+            + "."
+        )
+        results.append({
+            "relevance_score": int(round(float(relevance[i]))),
+            "justification": justification,
+            "key_matches": matched[:5] or ["None"],
+            "missing_requirements": missing[:5],
+            "soft_skills": matched_soft[:3],
+            "domain_fit": domain_phrases[i] or "None",
+        })
+    return results